@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+# BSD 3-Clause License
+#
+# Copyright (c) 2026, J. Foederer
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+class CandidateScorer:
+    """
+    Ranks candidate scenarios when extending a trace at random. Candidates are drawn with a
+    probability proportional to their score. This base scorer gives all candidates the same
+    score. Without any scorer, candidates are drawn using plain random selection.
+
+    Subclasses can override score() and use record() to learn from the outcome of earlier
+    insertion attempts. Scores must be positive.
+    """
+
+    def score(self, predecessor: int | None, candidate: int) -> float:
+        """predecessor is the id of the last scenario in the trace, or None at the start of the trace"""
+        return 1.0
+
+    def record(self, predecessor: int | None, candidate: int, accepted: bool, new_coverage: bool = False):
+        """Called after each attempt to insert candidate directly after predecessor"""
+        pass
+
+
+class HistoryScorer(CandidateScorer):
+    """
+    Scores candidates by their history during the current run:
+      - the fraction of earlier attempts in which the candidate was accepted after the same
+        predecessor. Pairs without history start at 1/2.
+      - how many scenarios were reached for the first time directly after the candidate. A
+        scenario that opened up new parts of the model before is likely to do so again.
+    """
+
+    def __init__(self):
+        self._attempts: dict[tuple[int | None, int], list[int]] = {}  # (predecessor, candidate): [accepted, tried]
+        self._enabled: dict[int, int] = {}
+
+    def score(self, predecessor: int | None, candidate: int) -> float:
+        accepted, tried = self._attempts.get((predecessor, candidate), (0, 0))
+        return (accepted + 1) / (tried + 2) * (1 + self._enabled.get(candidate, 0))
+
+    def record(self, predecessor: int | None, candidate: int, accepted: bool, new_coverage: bool = False):
+        counts = self._attempts.setdefault((predecessor, candidate), [0, 0])
+        counts[0] += accepted
+        counts[1] += 1
+        if new_coverage and predecessor is not None:
+            self._enabled[predecessor] = self._enabled.get(predecessor, 0) + 1
+
+
+SCORERS = {
+    'history': HistoryScorer,
+}
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+# BSD 3-Clause License
+#
+# Copyright (c) 2026, J. Foederer
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import ast
+import builtins
+import re
+
+from .modelspace import ModelSpace
+from .suitedata import Scenario
+
+
+class ScenarioDependencies:
+    """
+    Domain terms that a scenario works with, as far as can be told from its model info without
+    running it.
+
+    requires: Terms that must exist in the model before the scenario starts. Without them, the
+              scenario is guaranteed to be rejected.
+    creates:  Terms introduced by the scenario using `new term`.
+    reads:    Terms of which attributes are read in IN, OUT or MOD expressions.
+    writes:   Terms of which attributes are assigned or deleted, including created and deleted terms.
+    """
+
+    def __init__(self, scenario: Scenario):
+        self.requires: set[str] = set()
+        self.creates: set[str] = set()
+        self.reads: set[str] = set()
+        self.writes: set[str] = set()
+        self._analyse_reads_and_writes(scenario)
+        self._analyse_requirements(scenario)
+
+    def _analyse_reads_and_writes(self, scenario: Scenario):
+        for step in scenario.steps:
+            for key in ('IN', 'OUT', 'MOD'):
+                for expr in step.model_info.get(key, []):
+                    if key == 'MOD':
+                        # Only the constraint part of a modifier is a model expression
+                        expr = expr.split('=', 1)[-1]
+                    vocab_action, term = _vocab_action(expr)
+                    if vocab_action and term is None:
+                        continue  # The term's name depends on an argument
+                    if vocab_action == 'new':
+                        self.creates.add(term)
+                        self.writes.add(term)
+                    elif vocab_action == 'del':
+                        self.writes.add(term)
+                    elif (tree := _parse(expr)) is not None:
+                        for node in ast.walk(tree):
+                            if _is_term_attribute(node):
+                                if isinstance(node.ctx, ast.Load):
+                                    self.reads.add(node.value.id)
+                                else:
+                                    self.writes.add(node.value.id)
+
+    def _analyse_requirements(self, scenario: Scenario):
+        """
+        Walks the expressions that are certain to be evaluated when processing the scenario, in
+        processing order. Any domain term used there, that the scenario did not create itself,
+        must already be available. Otherwise evaluation fails and the scenario is rejected.
+        Analysis stops where evaluation could end without rejecting the scenario, which is at the
+        first OUT expression of a when-step (refinement) or at anything that cannot be analysed.
+        """
+        created = set()
+        for expr, last in _certainly_evaluated(scenario):
+            vocab_action, term = _vocab_action(expr)
+            if vocab_action and term is None:
+                return  # The term's name depends on an argument, any term could be affected
+            if vocab_action == 'new':
+                created.add(term)
+            elif vocab_action == 'del':
+                if term not in created:
+                    self.requires.add(term)
+            else:
+                tree = _parse(expr)
+                if tree is None:
+                    return
+                self.requires.update(t for t in _required_terms(tree) if t not in created)
+            if last:
+                return
+
+
+class DependencyGraph:
+    """
+    Static producer graph over the domain terms of a set of scenarios, based on their
+    model info. It is used to skip candidates that are bound to be rejected in the current state
+    and to prefer scenarios with fewer prerequisites when suggesting a new prio order.
+    """
+
+    def __init__(self, scenarios: list[Scenario]):
+        self.scenarios: dict[int, ScenarioDependencies] = {s.src_id: ScenarioDependencies(s) for s in scenarios}
+        self.producers: dict[str, set[int]] = {}  # domain term -> scenarios that create it
+        for src_id, deps in self.scenarios.items():
+            for term in deps.creates:
+                self.producers.setdefault(term, set()).add(src_id)
+        self._depths = self._producer_depths()
+
+    def missing_terms(self, src_id: int, model: ModelSpace | None) -> list[str]:
+        """Returns the required domain terms of the scenario that are not available in the model"""
+        required = self.scenarios[src_id].requires
+        if not required:
+            return []
+        available = set(model.props) | set(model.values) if model else set()
+        return sorted(required - available)
+
+    def depth(self, src_id: int) -> int:
+        """
+        Number of scenarios that must at least precede this scenario in a chain of producers
+        to provide the required terms. Scenarios with unreachable requirements are put last.
+        """
+        return self._depths[src_id]
+
+    def _producer_depths(self) -> dict[int, int]:
+        unreachable = len(self.scenarios) + 1
+        depths = {src_id: 0 if not deps.requires else unreachable for src_id, deps in self.scenarios.items()}
+        for _ in range(len(self.scenarios)):
+            changed = False
+            for src_id, deps in self.scenarios.items():
+                if not deps.requires:
+                    continue
+                depth = 1 + max(min((depths[p] for p in self.producers.get(term, ()) if p != src_id),
+                                    default=unreachable) for term in deps.requires)
+                if depth < depths[src_id]:
+                    depths[src_id] = depth
+                    changed = True
+            if not changed:
+                break
+        return depths
+
+
+_ARG_PLACEHOLDER = re.compile(r'\$\{[^}]*\}')
+_ARG_NAME = '_robotmbt_arg_'
+# Unknown names are taken as literal strings by the model, so attributes that strings have do not
+# point to a domain term. Builtins and the scenario scope are always available. Names that contain
+# an argument are unknown until the argument is filled in, so they are never taken as domain terms.
+_STR_ATTRIBUTES = frozenset(dir(str))
+_ALWAYS_AVAILABLE = frozenset(dir(builtins)) | {'scenario'}
+# Nodes that open a new scope. Their content is not evaluated right away, if at all.
+_NESTED_SCOPES = (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp,
+                  ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def _certainly_evaluated(scenario: Scenario):
+    """
+    Yields the model expressions of the scenario that are evaluated when processing it, up to the
+    point where the outcome is no longer certain to be a rejection, paired with whether it is the last.
+    """
+    for step in scenario.steps:
+        if 'error' in step.model_info:
+            return
+        if step.gherkin_kw is None and not step.model_info:
+            continue
+        if 'IN' not in step.model_info or 'OUT' not in step.model_info:
+            return
+        if step.gherkin_kw in ['given', 'when', None]:
+            for expr in step.model_info['IN']:
+                yield expr, False
+        if step.gherkin_kw in ['when', 'then', None]:
+            for expr in step.model_info['OUT']:
+                # A failing OUT expression in a when-step leads to refinement instead of rejection
+                yield expr, step.gherkin_kw in ['when', None]
+                if step.gherkin_kw in ['when', None]:
+                    return
+
+
+def _vocab_action(expression: str) -> tuple[str | None, str | None]:
+    expr = expression.strip()
+    words = expr.split()
+    if len(words) == 2 and words[0].lower() in ('new', 'del'):
+        return words[0].lower(), None if _ARG_PLACEHOLDER.search(words[1]) else words[1]
+    return None, None
+
+
+def _parse(expression: str) -> ast.Module | None:
+    try:
+        return ast.parse(_ARG_PLACEHOLDER.sub(_ARG_NAME, expression.strip()))
+    except SyntaxError:
+        return None
+
+
+def _is_term_attribute(node: ast.AST) -> bool:
+    return (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)
+            and node.value.id not in _ALWAYS_AVAILABLE and _ARG_NAME not in node.value.id
+            and node.attr not in _STR_ATTRIBUTES)
+
+
+def _required_terms(tree: ast.Module) -> set[str]:
+    """Domain terms whose attributes are accessed unconditionally when running the expression"""
+    bound = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load)}
+    found = set()
+
+    def visit(node: ast.AST):
+        if isinstance(node, _NESTED_SCOPES):
+            return
+        if isinstance(node, ast.BoolOp):
+            visit(node.values[0])
+        elif isinstance(node, ast.IfExp):
+            visit(node.test)
+        elif isinstance(node, ast.Compare):
+            visit(node.left)
+            visit(node.comparators[0])
+        elif isinstance(node, (ast.If, ast.While)):
+            visit(node.test)
+        elif isinstance(node, ast.For):
+            visit(node.iter)
+        elif isinstance(node, ast.stmt) and not isinstance(node, (ast.Expr, ast.Assign, ast.AugAssign,
+                                                                  ast.AnnAssign, ast.Delete)):
+            return  # e.g. try-statements, where failures can be caught
+        else:
+            if _is_term_attribute(node) and node.value.id not in bound:
+                found.add(node.value.id)
+            for child in ast.iter_child_nodes(node):
+                visit(child)
+
+    for statement in tree.body:
+        visit(statement)
+    return found
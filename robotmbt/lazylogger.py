@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+# BSD 3-Clause License
+#
+# Copyright (c) 2026, J. Foederer
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from collections.abc import Callable
+from threading import current_thread
+
+from robot.api import logger
+
+try:  # Robot internals, which are not part of Robot's public API
+    from robot.output.librarylogger import LOGGING_THREADS
+    from robot.output.loglevel import LEVELS
+    from robot.running.context import EXECUTION_CONTEXTS
+except ImportError:
+    LOGGING_THREADS = LEVELS = EXECUTION_CONTEXTS = None
+
+
+def is_debug_enabled() -> bool:
+    """
+    True if debug messages end up in Robot's log. That is only the case for messages from Robot's
+    own threads, during execution, while the active log level includes DEBUG. The log level is
+    checked on each call, because it can be changed during execution (`Set Log Level`).
+
+    This relies on Robot's internals. If these are not available, e.g. after changes in Robot,
+    it is always True, leaving it to Robot's logger to drop the messages it does not log.
+    """
+    try:
+        if current_thread().name not in LOGGING_THREADS:
+            return False
+        context = EXECUTION_CONTEXTS.current
+        if context is None:
+            return False
+        return context.output.log_level.priority <= LEVELS['DEBUG']
+    except (AttributeError, KeyError, TypeError):
+        return True
+
+
+def debug(message: str | Callable[[], str], html: bool = False):
+    """
+    Logs a debug message to Robot's log. Pass a callable (e.g. a lambda returning an f-string) to
+    defer building the message. It is then only called when the message is actually logged.
+    """
+    if is_debug_enabled():
+        logger.debug(message() if callable(message) else message, html)
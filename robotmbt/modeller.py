@@ -30,12 +30,14 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+from collections import OrderedDict
+from copy import copy
 from typing import Any
 
-from robot.api import logger
 from robot.utils import is_list_like
 from robot.errors import TimeoutExceeded  # Raised by Robot in case of keyword timeout
 
+from .lazylogger import debug
 from .modelspace import ModelSpace
 from .steparguments import StepArgument, StepArguments, ArgKind
 from .substitutionmap import SubstitutionMap
@@ -43,28 +45,98 @@ from .suitedata import Scenario, Step
 from .tracestate import TraceState, TraceSnapShot
 
 
-def try_to_fit_in_scenario(candidate: Scenario, tracestate: TraceState):
+class LRUCache:
+    """Bounded dictionary that drops the least recently used entry when it runs out of space"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize: int = maxsize
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            return default
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def __setitem__(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    def copy(self):
+        """Returns an independent cache with the same entries. The cached values are shared."""
+        duplicate = LRUCache(self.maxsize)
+        duplicate._entries = self._entries.copy()
+        return duplicate
+
+
+def try_to_fit_in_scenario(candidate: Scenario, tracestate: TraceState, transpositions: LRUCache | None = None):
     """
     Tries to insert the candidate scenario into the trace (in full or partial) and
     updates tracestate accordingly.
+
+    When a transposition table is passed, the outcome of processing the candidate is
+    memoised by model state and scenario variant. Revisiting the same state with the
+    same variant then reuses the earlier outcome instead of re-evaluating all steps.
     """
     model = tracestate.model if tracestate.model else ModelSpace()
-    model.new_scenario_scope()
-    inserted, remainder, extra_data = process_scenario(candidate, model)
+    key = (model.state_key, candidate.src_id, _variant_key(candidate)) if transpositions is not None else None
+    outcome = transpositions.get(key) if key else None
+    if outcome is None:
+        model.new_scenario_scope()
+        inserted, remainder, extra_data = process_scenario(candidate, model)
+        if inserted and not remainder:
+            model.end_scenario_scope()
+    else:
+        cached_model, split_index, _ = outcome
+        model = cached_model.copy() if cached_model else None
+        if not model:
+            inserted = remainder = None
+            extra_data = dict(fail_msg=outcome[2])
+        elif split_index is None:
+            inserted, remainder = candidate.copy(), None
+        else:
+            inserted, remainder = split_for_refinement(candidate, candidate.steps[split_index])
+    split_index = len(inserted.steps) - 1 if remainder else None
+    result_model = None
+
     if not inserted:  # insertion failed
         tracestate.reject_scenario(candidate.src_id)
-        logger.debug(extra_data['fail_msg'])
+        debug(extra_data['fail_msg'])
     elif not remainder:  # the scenario processed in full
-        model.end_scenario_scope()
         tracestate.confirm_full_scenario(inserted.src_id, inserted, model)
-        logger.debug(f"Scenario {inserted.src_id} inserted: {inserted.name}")
+        result_model = tracestate[-1].model
+        debug(lambda: f"Scenario {inserted.src_id} inserted: {inserted.name}")
         if tracestate.is_refinement_active():
             handle_refinement_exit(inserted, tracestate)
     else:  # the scenario is split into two parts, ready for refinement
-        logger.debug(f"Scenario {inserted.src_id} partially inserted: {inserted.name}\n"
-                     f"Refinement needed at step: {remainder.steps[1]}")
+        debug(lambda: f"Scenario {inserted.src_id} partially inserted: {inserted.name}\n"
+                      f"Refinement needed at step: {remainder.steps[1]}")
         inserted.name = f"{inserted.name} (part {tracestate.highest_part(inserted.src_id)+1})"
         tracestate.push_partial_scenario(inserted.src_id, inserted, model, remainder)
+        result_model = tracestate[-1].model
+
+    if key and outcome is None:
+        # The outcome is stored as (resulting model, split index, fail message). A rejected scenario
+        # has no resulting model and a scenario that fits in full has no split index. The model is
+        # taken from the new snapshot, so that the entry shares its content with the trace, rather
+        # than holding a private copy of the whole model.
+        transpositions[key] = (result_model, split_index, extra_data.get('fail_msg'))
+
+
+def _variant_key(scenario: Scenario) -> tuple:
+    """Identifies the data choices of a scenario variant by the argument values of its steps"""
+    return tuple(tuple((arg.arg, repr(arg.value)) for arg in step.args) for step in scenario.steps)
 
 
 def process_scenario(scenario: Scenario, model: ModelSpace) -> tuple[Scenario, Scenario, dict[str, Any]]:
@@ -138,38 +210,91 @@ def handle_refinement_exit(inserted_refinement: Scenario, tracestate: TraceState
 
     if not exit_conditions_processed:
         rewind(tracestate)  # Reject insterted scenario. Even though it fits, it is not a refinement.
-        logger.debug(f"Reconsidering scenario {inserted_refinement.src_id}, "
-                     f"refinement exit condition not met for scenario {refinement_tail.src_id}: {exit_conditions}")
+        debug(lambda: f"Reconsidering scenario {inserted_refinement.src_id}, "
+                      f"refinement exit condition not met for scenario {refinement_tail.src_id}: {exit_conditions}")
         return
 
     model = tracestate.model
     tail_inserted, remainder, extra_data = process_scenario(refinement_tail, model)
     if not tail_inserted:
-        logger.debug(extra_data['fail_msg'])
+        debug(extra_data['fail_msg'])
         # Confirm then rewind, to roll back complete scenario, including its refinements
         # Because that exit check passed, this is an error in the refined scenario itself
         tracestate.confirm_full_scenario(refinement_tail.src_id, refinement_tail, model)
         tail = rewind(tracestate)
-        logger.debug(f"Having to roll back up to {tail.scenario.name if tail else 'the beginning'}")
+        debug(lambda: f"Having to roll back up to {tail.scenario.name if tail else 'the beginning'}")
     elif not remainder:
         model.end_scenario_scope()
         tracestate.confirm_full_scenario(tail_inserted.src_id, tail_inserted, model)
-        logger.debug(f"Scenario {tail_inserted.src_id} completed after refinement: {tail_inserted.name}")
+        debug(lambda: f"Scenario {tail_inserted.src_id} completed after refinement: {tail_inserted.name}")
         if tracestate.is_refinement_active():
             handle_refinement_exit(tail_inserted, tracestate)
     else:
-        logger.debug(f"Partially inserted remainder of scenario {tail_inserted.src_id}, {tail_inserted.name}\n"
-                     f"refinement needed at step: {remainder.steps[1]}")
+        debug(lambda: f"Partially inserted remainder of scenario {tail_inserted.src_id}, {tail_inserted.name}\n"
+                      f"refinement needed at step: {remainder.steps[1]}")
         tail_inserted.name = f"{tail_inserted.name} (part {tracestate.highest_part(tail_inserted.src_id)+1})"
         tracestate.push_partial_scenario(tail_inserted.src_id, tail_inserted, model, remainder)
 
 
-def generate_scenario_variant(scenario: Scenario, model: ModelSpace) -> Scenario:
-    scenario = scenario.copy()
-    # collect set of constraints
+def generate_scenario_variant(scenario: Scenario, model: ModelSpace,
+                              collected_constraints: LRUCache | None = None) -> Scenario:
+    """
+    Returns a copy of the scenario with new data choices made for all of its modifiers,
+    or None if the modifiers leave no valid choices.
+
+    When a cache is passed, the constraints collected from the modifiers are memoised
+    per scenario and model state. Retrying the same scenario against the same model then
+    only draws a new solution, without evaluating the modifier expressions again.
+    """
+    key = (scenario.src_id, model.state_key, _variant_key(scenario)) if collected_constraints is not None else None
+    collected = collected_constraints.get(key) if key else None
+    if collected is None:
+        collected = _collect_constraints(scenario, model)
+        if key:
+            collected_constraints[key] = collected
+    if isinstance(collected, str):
+        debug(lambda: f"Rejecting scenario {scenario.src_id}, {scenario.name}, due to modifier\n    {collected}")
+        return None
+
+    subs, arg_updates = collected
+    subs = subs.copy()
+    scenario = _copy_with_own_modifier_steps(scenario)
+    for step_index, arg, value in arg_updates:
+        scenario.steps[step_index].args[arg].value = copy(value)
+    try:
+        subs.solve()
+    except ValueError as err:
+        debug(lambda: f"Rejecting scenario {scenario.src_id}, {scenario.name}, due to modifier\n"
+                      f"    {err}: {subs}")
+        return None
+
+    # Update scenario with generated values
+    if subs.solution:
+        debug(lambda: f"Example variant generated with argument substitution (↦ replaced by): {subs}")
+    scenario.data_choices = subs
+    for step in scenario.steps:
+        if 'MOD' in step.model_info:
+            for expr in step.model_info['MOD']:
+                modded_arg, _ = _parse_modifier_expression(expr, step.args)
+                if step.args[modded_arg].is_default:
+                    continue
+                org_example = step.args[modded_arg].org_value
+                if step.args[modded_arg].kind in [ArgKind.EMBEDDED, ArgKind.POSITIONAL, ArgKind.NAMED]:
+                    step.args[modded_arg].value = subs.solution[org_example]
+    return scenario
+
+
+def _collect_constraints(scenario: Scenario, model: ModelSpace) -> tuple[SubstitutionMap, list[tuple]] | str:
+    """
+    Evaluates all modifiers in the scenario. Returns the unsolved substitution map, together
+    with the (step index, argument, value) updates for varargs and free named arguments, which
+    are used as-is. If the modifiers cannot be evaluated, the reason is returned instead.
+    """
+    scenario = _copy_with_own_modifier_steps(scenario)
     subs = SubstitutionMap()
+    arg_updates = []
     try:
-        for step in scenario.steps:
+        for step_index, step in enumerate(scenario.steps):
             for expr in step.model_info.get('MOD', []):
                 modded_arg, constraint = _parse_modifier_expression(expr, step.args)
                 if step.args[modded_arg].is_default:
@@ -204,6 +329,7 @@ def generate_scenario_variant(scenario: Scenario, model: ModelSpace) -> Scenario
                         # change the number of arguments in the list, making it impossible to decide which values to
                         # match and which to drop and/or duplicate.
                         step.args[modded_arg].value = modded_varargs
+                        arg_updates.append((step_index, modded_arg, modded_varargs))
                 elif step.args[modded_arg].kind == ArgKind.FREE_NAMED:
                     if step.args[modded_arg].value:
                         modded_free_args = model.process_expression(constraint, step.args)
@@ -211,35 +337,20 @@ def generate_scenario_variant(scenario: Scenario, model: ModelSpace) -> Scenario
                             raise ValueError("Modifying free named arguments must yield a dict")
                         # Similar to varargs, modified free named arguments are used directly as-is.
                         step.args[modded_arg].value = modded_free_args
+                        arg_updates.append((step_index, modded_arg, modded_free_args))
                 else:
                     raise AssertionError(f"Unknown argument kind for {modded_arg}")
     except TimeoutExceeded:
         raise
     except Exception as err:
-        logger.debug(f"Rejecting scenario {scenario.src_id}, {scenario.name}, due to modifier\n"
-                     f"    In step {step}: {err}")
-        return None
+        return f"In step {step}: {err}"
+    return subs, arg_updates
 
-    try:
-        subs.solve()
-    except ValueError as err:
-        logger.debug(f"Rejecting scenario {scenario.src_id}, {scenario.name}, due to modifier\n"
-                     f"    {err}: {subs}")
-        return None
 
-    # Update scenario with generated values
-    if subs.solution:
-        logger.debug(f"Example variant generated with argument substitution (↦ replaced by): {subs}")
-    scenario.data_choices = subs
-    for step in scenario.steps:
-        if 'MOD' in step.model_info:
-            for expr in step.model_info['MOD']:
-                modded_arg, _ = _parse_modifier_expression(expr, step.args)
-                if step.args[modded_arg].is_default:
-                    continue
-                org_example = step.args[modded_arg].org_value
-                if step.args[modded_arg].kind in [ArgKind.EMBEDDED, ArgKind.POSITIONAL, ArgKind.NAMED]:
-                    step.args[modded_arg].value = subs.solution[org_example]
+def _copy_with_own_modifier_steps(scenario: Scenario) -> Scenario:
+    """Copies the scenario, including the steps with modifiers, which are the only ones that get updated"""
+    scenario = scenario.copy()
+    scenario.steps = [step.copy() if 'MOD' in step.model_info else step for step in scenario.steps]
     return scenario
 
 
@@ -256,10 +367,20 @@ def _parse_modifier_expression(expression: str, args: StepArguments) -> tuple[st
 
 
 def rewind(tracestate: TraceState, drought_recovery: bool = False) -> TraceSnapShot | None:
+    """
+    Rewinds the most recent scenario. With drought_recovery, the trace is rewound to the last point
+    where coverage increased while no refinement was open (see TraceState.rewind_to_recovery_point).
+    This may go further back than the last scenario that increased coverage. Only when there is no
+    such point within the rewind limit, scenarios are rewound one at a time until the drought ends.
+    """
+    if drought_recovery:
+        tail = tracestate.rewind_to_recovery_point()
+        if tail:
+            return tail
     tail = tracestate.rewind()
     while drought_recovery and tracestate.coverage_drought:
         if not tracestate.can_rewind():
-            logger.debug(
+            debug(
                 f"Coverage drought recovery stalled. {tracestate.coverage_drought} Scenarios are already committed.")
             break
         tail = tracestate.rewind()
@@ -30,8 +30,13 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import ast
 import copy
-from typing import Any
+import dis
+import hashlib
+from functools import lru_cache
+from types import CodeType
+from typing import Any, Literal
 
 from .steparguments import StepArguments
 
@@ -47,16 +52,149 @@ class ModelSpace:
         self.props: dict[str, RecursiveScope | ModelSpace] = dict()
         self.values: dict[str, Any] = dict()  # For using literals without having to use quotes (abc='abc')
         self.scenario_vars: list[RecursiveScope] = []
+        self._namespace: dict[str, Any] | None = None  # Reusable evaluation namespace, rebuilt after changes
+        self._shared: bool = False  # True while the content is possibly shared with copies of this model
+        self._own_terms: set[str] = set()  # Terms that were copied while the rest of the content is shared
+        # Terms (or 'scenario' for the scenario scopes) that hold more than plain data, like references
+        # to other terms. Only while there are none, expressions can be confined to the terms they name.
+        self._entangled: frozenset[str] = frozenset()
+        self._fingerprint: str | None = None  # Cached until the model is modified
+        self._state_key: str | None = None  # Cached until the model is modified
         self.std_attrs = dir(self)
 
     def __repr__(self):
         return self.ref_id if self.ref_id else super().__repr__()
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_namespace'] = None  # the namespace holds references to builtins and is cheap to rebuild
+        return state
+
     def copy(self):
-        return copy.deepcopy(self)
+        """
+        Returns a copy that shares its domain content with this model. The content is only
+        duplicated once either of them is about to modify it (copy-on-write). Copies are cheap
+        that way, which matters because the trace keeps a model for every step it takes.
+        """
+        cp = self.__class__.__new__(self.__class__)
+        cp.__dict__.update(self.__dict__)
+        cp.props = self.props.copy()
+        cp.values = self.values.copy()
+        cp.scenario_vars = self.scenario_vars[:]
+        cp._own_terms = set()
+        self._own_terms = set()
+        self._shared = cp._shared = True
+        return cp
+
+    def _make_private(self, names: frozenset[str] | None = None):
+        """
+        Ends sharing by taking a private copy of the content that an expression can modify. When the
+        expression only reaches the terms it names (see referenced_names), only those are copied.
+        Terms that hold more than plain data may lead to other terms, so then all content is copied.
+        """
+        if not self._shared:
+            return
+        if names is None or self._entangled:
+            # All content is copied in one go to keep references between domain terms intact
+            self.props, self.values, self.scenario_vars = copy.deepcopy((self.props, self.values, self.scenario_vars))
+            for name, prop in self.props.items():
+                if name != 'scenario':
+                    setattr(self, name, prop)
+            self._namespace = None
+            self._shared = False
+            return
+        for name in names - self._own_terms:
+            if name == 'scenario' and self.scenario_vars:
+                self.scenario_vars = copy.deepcopy(self.scenario_vars)
+                self.props['scenario'] = self.scenario_vars[-1]
+            elif name in self.props and name != 'scenario':
+                self.props[name] = copy.deepcopy(self.props[name])
+                setattr(self, name, self.props[name])
+            else:
+                continue
+            self._own_terms.add(name)
+            self._namespace = None
+
+    def _track_entanglement(self, names: frozenset[str] | None = None):
+        """Updates which of the named terms hold more than plain data. Without names, all terms are checked."""
+        entangled = set(self._entangled)
+        for name in (self.props.keys() | self._entangled) if names is None else names:
+            if name == 'scenario':
+                plain = all(_is_plain(value) for scope in self.scenario_vars
+                            for attr, value in vars(scope).items() if attr != '_outer_scope')
+            elif name not in self.props:
+                plain = True
+            else:
+                term = self.props[name]
+                # A name that was rebound to another term's object shares that object with the other name
+                plain = ((not isinstance(term, ModelSpace) or term.ref_id == name)
+                         and all(map(_is_plain, _term_values(term))))
+            if plain:
+                entangled.discard(name)
+            else:
+                entangled.add(name)
+        self._entangled = frozenset(entangled)
+
+    def share_unchanged_terms(self, other: 'ModelSpace'):
+        """
+        Takes over the domain terms from other that are in the same state as in this model, so that
+        both models share them instead of each holding their own copy. Both models must be copies
+        that are no longer modified in place (see copy), like the models kept in a trace.
+
+        Terms that are already shared are not checked. As long as all terms hold plain data only,
+        the other terms are the ones that expressions touched since the models were copied (see
+        _make_private). Terms are not shared at all when any term holds more than plain data. Such
+        a term, e.g. one that refers to another term, would end up referring to the wrong object.
+        """
+        if not (self._shared and other._shared) or self._entangled or other._entangled:
+            return
+        for name, term in self.props.items():
+            theirs = other.props.get(name)
+            if (name == 'scenario' or theirs is term
+                    or not isinstance(term, ModelSpace) or not isinstance(theirs, ModelSpace)):
+                continue
+            if _term_state(term) == _term_state(theirs):
+                self.props[name] = theirs
+                setattr(self, name, theirs)
+                self._own_terms.discard(name)
+                self._namespace = None
 
     def __eq__(self, other):
-        return self.get_status_text() == other.get_status_text()
+        return self.fingerprint == other.fingerprint
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Digest of the model's state, as shown by the status text. Models are equal when they have the
+        same fingerprint. It is computed once and then kept (also by copies) until the model is modified.
+        Note that only modifications via the model's own methods are tracked.
+        """
+        if self._fingerprint is None:
+            self._fingerprint = hashlib.blake2b(self.get_status_text().encode(), digest_size=16).hexdigest()
+        return self._fingerprint
+
+    @property
+    def state_key(self) -> str:
+        """
+        Digest of the model's exact state, for memoising outcomes of processing the model. Unlike the
+        fingerprint, it also covers the literal aliases and distinguishes between values like 1 and '1'.
+        It is cached in the same way as the fingerprint.
+        """
+        if self._state_key is None:
+            self._state_key = hashlib.blake2b(self._state_text().encode(), digest_size=16).hexdigest()
+        return self._state_key
+
+    def _state_text(self) -> str:
+        """
+        Canonical text representation of the state. Unlike the status text, it distinguishes between
+        values like 1 and '1', includes the literal aliases and keeps the scenario scopes apart.
+        """
+        terms = [(p, [(attr, repr(getattr(self.props[p], attr))) for attr in dir(self.props[p])]
+                  if isinstance(self.props[p], ModelSpace) else repr(self.props[p]))
+                 for p in self.props if p != 'scenario']
+        scopes = [sorted((attr, repr(value)) for attr, value in vars(scope).items() if attr != '_outer_scope')
+                  for scope in self.scenario_vars]
+        return repr((terms, scopes, sorted(self.values.items())))
 
     def add_prop(self, name: str):
         if name == 'scenario':
@@ -65,6 +203,8 @@ class ModelSpace:
             raise ModellingError(f"Naming conflict, '{name}' already in use.")
         self.props[name] = ModelSpace(name)
         setattr(self, name, self.props[name])
+        self._own_terms.add(name)
+        self._namespace = self._fingerprint = self._state_key = None
 
     def del_prop(self, name: str):
         if name == 'scenario':
@@ -73,6 +213,9 @@ class ModelSpace:
             raise ModellingError(f"Delete failed, '{name}' is not defined.")
         self.props.pop(name)
         delattr(self, name)
+        self._own_terms.discard(name)
+        self._entangled -= {name}
+        self._namespace = self._fingerprint = self._state_key = None
 
     def __dir__(self, recurse=True):
         if recurse:
@@ -83,6 +226,7 @@ class ModelSpace:
     def new_scenario_scope(self):
         self.scenario_vars.append(RecursiveScope(self.scenario_vars[-1] if len(self.scenario_vars) else None))
         self.props['scenario'] = self.scenario_vars[-1]
+        self._namespace = self._fingerprint = self._state_key = None
 
     def end_scenario_scope(self):
         assert len(self.scenario_vars) > 0, ".end_scenario_scope() called, but there is no scenario scope open."
@@ -91,6 +235,9 @@ class ModelSpace:
             self.props['scenario'] = self.scenario_vars[-1]
         else:
             self.props.pop('scenario')
+        if 'scenario' in self._entangled:
+            self._track_entanglement(frozenset({'scenario'}))
+        self._namespace = self._fingerprint = self._state_key = None
 
     def process_expression(self, expression: str, step_args: StepArguments = StepArguments()) -> Any:
         expr = step_args.fill_in_args(expression.strip(), as_code=True)
@@ -102,36 +249,53 @@ class ModelSpace:
             self.del_prop(self._vocab_term(expr))
             return 'exec'
 
-        local_locals = locals()
-        for p in self.props:
-            exec(f"{p} = self.props['{p}']", local_locals)
-        for v in self.values:
-            value = f"'{self.values[v]}'" if isinstance(self.values[v], str) else self.values[v]
-            exec(f"{v} = {value}", local_locals)
+        mode, code = compile_expression(expr)
+        modifies = may_modify_model(expr)
+        # An expression can only reach the terms it names, unless terms refer to each other
+        names = None if self._entangled else referenced_names(expr)
+        if modifies:
+            self._make_private(names)
+            self._fingerprint = self._state_key = None
+        rebinds = rebound_names(code)
+        # The shared namespace is only handed out when the expression cannot rebind any names in it
+        namespace = dict(self._eval_namespace()) if rebinds else self._eval_namespace()
         try:
-            result = eval(expr, local_locals)
-        except SyntaxError:
             try:
-                exec(expr, local_locals)
-                result = 'exec'
+                if mode == 'exec':
+                    exec(code, namespace)
+                    result = 'exec'
+                else:
+                    result = eval(code, namespace)
             except NameError as missing:
+                if missing.name == expr:
+                    raise  # Putting only a name in an expression can be used as exists check
                 self.__add_alias(missing.name, step_args)
-                result = self.process_expression(expression, step_args)
+                return self.process_expression(expression, step_args)
             except AttributeError as err:
                 self.__handle_attribute_error(err)
-        except NameError as missing:
-            if missing.name == expr:
-                raise  # Putting only a name in an expression can be used as exists check
-            self.__add_alias(missing.name, step_args)
-            result = self.process_expression(expression, step_args)
-        except AttributeError as err:
-            self.__handle_attribute_error(err)
 
-        for p in self.props:
-            exec(f"self.props['{p}'] = {p}", local_locals)
+            rebound_props = [p for p in self.props if p in rebinds]
+            for p in rebound_props:
+                self.props[p] = namespace[p]
+                self._own_terms.add(p)
+            if rebound_props:
+                self._namespace = self._fingerprint = self._state_key = None
+        finally:
+            if modifies or rebinds:
+                self._track_entanglement(names)
 
         return result
 
+    def _eval_namespace(self) -> dict[str, Any]:
+        """Namespace with all domain terms and literal aliases, for evaluating model expressions"""
+        if self._namespace is None:
+            namespace = dict(self.props)
+            for v in self.values:
+                value = f"'{self.values[v]}'" if isinstance(self.values[v], str) else self.values[v]
+                namespace[v] = eval(compile_expression(str(value))[1], namespace)
+            self._namespace = namespace
+        return self._namespace
+
     def __handle_attribute_error(self, err: AttributeError):
         if isinstance(err.obj, str) and err.obj in self.values:
             # This situation occurs when using e.g. 'foo.bar' in the model before calling 'new foo'.
@@ -151,6 +315,7 @@ class ModelSpace:
                 value = value.replace(f'\\{esc_char}', f'\\\\{esc_char}')
             value = value.replace("'", r"\'")  # Needed because we use single quotes in low level processing later on
         self.values[missing_name] = value
+        self._namespace = self._fingerprint = self._state_key = None
 
     @staticmethod
     def _is_new_vocab_expression(expression: str) -> bool:
@@ -181,6 +346,122 @@ class ModelSpace:
         return status
 
 
+@lru_cache(maxsize=8192)
+def compile_expression(expression: str) -> tuple[Literal['eval', 'exec'], CodeType]:
+    """
+    Compiles a (filled-in) model expression. Expressions are compiled for evaluation when possible,
+    otherwise they are compiled as statement. The result is cached process-wide, because the same
+    expressions are evaluated over and over again during trace generation.
+    """
+    try:
+        return 'eval', compile(expression, '<string>', 'eval')
+    except SyntaxError:
+        return 'exec', compile(expression, '<string>', 'exec')
+
+
+@lru_cache(maxsize=8192)
+def rebound_names(code: CodeType) -> frozenset[str]:
+    """Names that are (re)bound or deleted in the namespace that the code is executed in"""
+    return frozenset(_stored_names(code, ('STORE_NAME', 'DELETE_NAME', 'STORE_GLOBAL', 'DELETE_GLOBAL')))
+
+
+@lru_cache(maxsize=8192)
+def referenced_names(expression: str) -> frozenset[str] | None:
+    """
+    Names that the (filled-in) expression refers to, or None when it can reach objects in other ways,
+    e.g. via globals() or dunder attributes. When domain terms hold plain data only, these names are
+    the only terms that the expression can reach.
+    """
+    try:
+        tree = ast.parse(expression)
+    except SyntaxError:
+        return None
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if node.id in _NAMESPACE_ACCESS:
+                return None
+            names.add(node.id)
+        elif isinstance(node, ast.Attribute) and node.attr.startswith('__'):
+            return None
+    return frozenset(names)
+
+
+# Builtins that give access to the namespace without naming the objects in it
+_NAMESPACE_ACCESS = frozenset({'globals', 'locals', 'vars', 'eval', 'exec', 'breakpoint', '__builtins__',
+                               '__import__'})
+
+
+@lru_cache(maxsize=8192)
+def may_modify_model(expression: str) -> bool:
+    """
+    Conservative check whether running the (filled-in) expression could modify any objects it has
+    access to. Rebinding names does not count, that only affects the namespace. Calls count as a
+    possible modification, except for calls to the side-effect-free builtins in _READ_ONLY_BUILTINS.
+
+    A model that is shared with its copies is copied in full before running an expression that may
+    modify it, so read-only checks should preferably avoid calling methods, e.g. by using
+    `len(foo.items) > 0` instead of `foo.items.count(x) > 0`.
+    """
+    try:
+        tree = ast.parse(expression)
+    except SyntaxError:
+        return True
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Attribute, ast.Subscript)) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            return True
+        if isinstance(node, (ast.AugAssign, ast.With, ast.AsyncWith)):
+            return True  # In-place operators can modify the object that a name refers to
+        if isinstance(node, ast.Call) and not _is_read_only_call(node):
+            return True
+    return False
+
+
+# Builtins that do not modify their arguments. Names in the model namespace that shadow a builtin
+# refer to domain terms or literal aliases, which are not callable.
+_READ_ONLY_BUILTINS = frozenset({'abs', 'all', 'any', 'bool', 'callable', 'chr', 'dict', 'divmod', 'enumerate',
+                                 'float', 'format', 'frozenset', 'getattr', 'hasattr', 'hash', 'int', 'isinstance',
+                                 'issubclass', 'len', 'list', 'max', 'min', 'ord', 'pow', 'range', 'repr',
+                                 'reversed', 'round', 'set', 'sorted', 'str', 'sum', 'tuple', 'type', 'zip'})
+
+
+def _is_read_only_call(node: ast.Call) -> bool:
+    # A key function is called by the builtin and could be anything
+    return (isinstance(node.func, ast.Name) and node.func.id in _READ_ONLY_BUILTINS
+            and not any(kw.arg in ('key', None) for kw in node.keywords))
+
+
+def _stored_names(code: CodeType, store_ops: tuple[str, ...]) -> set[str]:
+    names = {instr.argval for instr in dis.get_instructions(code) if instr.opname in store_ops}
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            # Nested scopes, like lambdas and comprehensions, can only rebind names via a global statement
+            names |= _stored_names(const, ('STORE_GLOBAL', 'DELETE_GLOBAL'))
+    return names
+
+
+_PLAIN_TYPES = (str, int, float, complex, bool, bytes, type(None))
+
+
+def _is_plain(value: Any) -> bool:
+    """True for values that are plain data all the way down, without references to other objects"""
+    if isinstance(value, _PLAIN_TYPES):
+        return True
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return all(_is_plain(item) for item in value)
+    if isinstance(value, dict):
+        return all(_is_plain(key) and _is_plain(item) for key, item in value.items())
+    return False
+
+
+def _term_values(term: Any) -> list[Any]:
+    return [getattr(term, attr) for attr in dir(term)] if isinstance(term, ModelSpace) else [term]
+
+
+def _term_state(term: 'ModelSpace') -> list[tuple[str, str]]:
+    return [(attr, repr(getattr(term, attr))) for attr in dir(term)]
+
+
 class RecursiveScope:
     """
     Generic scoping object with the properties needed for handling scenario variables with refinement.
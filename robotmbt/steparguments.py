@@ -31,33 +31,86 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 from enum import Enum, auto
+from functools import lru_cache
 from keyword import iskeyword
 from typing import Any
 import builtins
+import re
 
 
 class StepArguments(list):
     def __init__(self, iterable=[]):
         super().__init__(item.copy() for item in iterable)
+        # Lookup by casefolded argument reference, built on first use and dropped on any change to the list
+        self._index: dict[str, StepArgument] | None = None
 
     def fill_in_args(self, text: str, as_code: bool = False) -> str:
-        result = text
-        for arg in self:
-            sub = arg.codestring if as_code else str(arg.value)
-            result = result.replace(arg.arg, sub)
-        return result
+        plan = _substitution_plan(text, tuple(arg.arg for arg in self))
+        if len(plan) == 1:
+            return text
+        parts = list(plan)
+        for i in range(1, len(parts), 2):
+            arg = super().__getitem__(parts[i])
+            parts[i] = arg.codestring if as_code else str(arg.value)
+        return ''.join(parts)
 
     def __getitem__(self, key):
-        for steparg in self:
-            if key.casefold() == steparg.arg.casefold():
-                return steparg
-        return super()[key]
+        if not isinstance(key, str):
+            return super().__getitem__(key)
+        if self._index is None:
+            self._index = {}
+            for steparg in self:
+                self._index.setdefault(steparg.arg.casefold(), steparg)
+        try:
+            return self._index[key.casefold()]
+        except KeyError:
+            raise KeyError(key) from None
+
+    def _invalidating(method):
+        def wrapper(self, *args, **kwargs):
+            self._index = None
+            return method(self, *args, **kwargs)
+        wrapper.__name__ = method.__name__
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+
+    __setitem__ = _invalidating(list.__setitem__)
+    __delitem__ = _invalidating(list.__delitem__)
+    __iadd__ = _invalidating(list.__iadd__)
+    __imul__ = _invalidating(list.__imul__)
+    append = _invalidating(list.append)
+    extend = _invalidating(list.extend)
+    insert = _invalidating(list.insert)
+    remove = _invalidating(list.remove)
+    pop = _invalidating(list.pop)
+    clear = _invalidating(list.clear)
+    del _invalidating
 
     @property
     def modified(self) -> bool:
         return any([arg.modified for arg in self])
 
 
+@lru_cache(maxsize=4096)
+def _substitution_plan(text: str, arg_refs: tuple[str, ...]) -> tuple[str | int, ...]:
+    """
+    Splits text into a template for fill_in_args. Literal text is at the even positions,
+    the odd positions hold the index of the argument to fill in at that spot. Copies of
+    steps have the same text and arguments, so they all reuse the same plan.
+    """
+    present = sorted({ref for ref in arg_refs if ref in text}, key=len, reverse=True)
+    if not present:
+        return (text,)
+    plan = []
+    pos = 0
+    for match in re.finditer('|'.join(map(re.escape, present)), text):
+        plan.append(text[pos:match.start()])
+        plan.append(arg_refs.index(match.group()))
+        pos = match.end()
+    plan.append(text[pos:])
+    return tuple(plan)
+
+
 class ArgKind(Enum):
     EMBEDDED = auto()
     POSITIONAL = auto()
@@ -68,6 +121,8 @@ class ArgKind(Enum):
 
 
 class StepArgument:
+    __slots__ = ('name', 'org_value', 'kind', '_value', '_codestr', 'is_default')
+
     def __init__(self, arg_name: str, value: Any, kind: ArgKind = ArgKind.UNKNOWN, is_default: bool = False):
         self.name: str = arg_name
         self.org_value: Any = value
@@ -102,8 +157,13 @@ class StepArgument:
         return self._codestr
 
     def copy(self):
-        cp = StepArgument(self.arg.strip('${}'), self.value, self.kind, self.is_default)
+        cp = StepArgument.__new__(StepArgument)
+        cp.name = self.arg.strip('${}')
         cp.org_value = self.org_value
+        cp.kind = self.kind
+        cp._value = self._value
+        cp._codestr = self._codestr
+        cp.is_default = self.is_default
         return cp
 
     def __str__(self):
@@ -30,8 +30,10 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-import random
-from typing import Any
+from math import lcm
+from typing import Any, Iterable
+
+from . import randomiser
 
 
 class SubstitutionMap:
@@ -46,6 +48,7 @@ class SubstitutionMap:
     def __init__(self):
         self.substitutions = {}  # {example_value:Constraint}
         self.solution = {}       # {example_value:solution_value}
+        self.universe = OptionUniverse()
 
     def __str__(self):
         src = self.solution or self.substitutions
@@ -53,6 +56,8 @@ class SubstitutionMap:
 
     def copy(self):
         new = SubstitutionMap()
+        # The universe only ever grows, so copies can keep sharing it
+        new.universe = self.universe
         new.substitutions = {k: v.copy() for k, v in self.substitutions.items()}
         new.solution = self.solution.copy()
         return new
@@ -62,99 +67,329 @@ class SubstitutionMap:
         if example_value in self.substitutions:
             self.substitutions[example_value].add_constraint(constraint)
         else:
-            self.substitutions[example_value] = Constraint(constraint)
+            self.substitutions[example_value] = Constraint(constraint, self.universe)
 
     def solve(self) -> dict[str, str]:
         self.solution = {}
-        solution: dict[str, str] = dict()
-        substitutions = self.copy().substitutions
-        unsolved_subs = list(substitutions)
-        subs_stack = []
-        while unsolved_subs:
-            unsolved_subs.sort(key=lambda i: len(substitutions[i].optionset))
-            example_value = unsolved_subs[0]
-            solution[example_value] = random.choice(substitutions[example_value].optionset)
-            subs_stack.append(example_value)
-            others_list = []
-            try:
-                # exclude the choice from all others
-                for other in [e for e in substitutions if e != example_value]:
-                    others_list.append(other)
-                    substitutions[other].remove_option(solution[example_value])
-                unsolved_subs.pop(0)
-            except ValueError:
-                # wrong choice, it depleted the last option for another example value
-                for affected_other in others_list:
-                    substitutions[affected_other].undo_remove()
-                # roll back last choice
-                solution.pop(example_value)
-                subs_stack.pop()
-                rollback_done = False
-                while not rollback_done:
-                    try:
-                        while subs_stack[-1] == example_value:
-                            substitutions[example_value].undo_remove()
-                            subs_stack.pop()
-                    except IndexError:
-                        # nothing left to roll back, no options remaining
-                        raise ValueError("No solution found within the set of given constraints")
-                    last_item = subs_stack[-1]
-                    unsolved_subs.insert(0, last_item)
-                    for other in [e for e in substitutions if e != last_item]:
-                        substitutions[other].undo_remove()
-                    try:
-                        substitutions[last_item].remove_option(solution.pop(last_item))
-                        rollback_done = True
-                    except ValueError:
-                        # next level must also be rolled back
-                        example_value = last_item
+        solution = _Solver(self.substitutions).solve()
         self.solution = solution
         return solution
 
 
-class Constraint:
-    def __init__(self, constraint: list[Any]):
+class _Solver:
+    """
+    Assigns a unique value to each example value, picked from its constraint.
+
+    Each choice is followed by propagation: the chosen value is removed from
+    all other example values and, whenever that leaves an example value with a
+    single option, that option is removed from the others as well. For the
+    all-different relation between example values, this is what arc
+    consistency amounts to. Every removal records which choices caused it, so
+    that when an example value runs out of options, the search can jump back
+    to the most recent choice that contributed to it, rather than retrying
+    choices that are unrelated to the conflict.
+    """
+
+    def __init__(self, substitutions: dict[str, 'Constraint']):
+        self.example_values = list(substitutions)
+        self.domains = {e: substitutions[e].copy() for e in self.example_values}
+        self.removals: dict[str, list[tuple[Any, frozenset]]] = {e: [] for e in self.example_values}
+        self.unsolved = list(self.example_values)
+        self.solution: dict[str, Any] = {}
+
+    def solve(self) -> dict[str, Any]:
+        singles = [e for e in self.example_values if len(self.domains[e]) == 1]
+        for example_value in singles:
+            if self._propagate(example_value, self.domains[example_value].optionset[0], frozenset(), []) is not None:
+                raise ValueError("No solution found within the set of given constraints")
+        if self._search() is not None:
+            raise ValueError("No solution found within the set of given constraints")
+        return {e: self.solution[e] for e in self.example_values}
+
+    def _search(self) -> set[str] | None:
+        """
+        Returns None when a solution is found. Otherwise returns the set of
+        earlier choices that are responsible for the conflict.
+        """
+        if not self.unsolved:
+            return None
+        self.unsolved.sort(key=lambda e: len(self.domains[e]))
+        covered_mask = 0
+        covered_ranges = 0
+        for count, example_value in enumerate(self.unsolved, start=1):
+            domain = self.domains[example_value]
+            if domain.range is None:
+                covered_mask |= domain.mask
+            else:
+                covered_ranges += len(domain)  # overlap between ranges is not counted, so this is an upper bound
+            n_covered = covered_mask.bit_count() + covered_ranges
+            if n_covered >= len(self.unsolved):
+                break
+            if n_covered < count:
+                # more example values than there are options between them
+                return self._reasons(self.unsolved[:count])
+        example_value = self.unsolved.pop(0)
+        conflict = set()
+        tried = set()
+        while (choice := self.domains[example_value].pick(tried)) is not None:
+            tried.add(choice)
+            self.solution[example_value] = choice
+            trail = []
+            culprits = self._propagate(example_value, choice, frozenset([example_value]), trail)
+            if culprits is None:
+                culprits = self._search()
+                if culprits is None:
+                    return None
+            self._undo(trail)
+            del self.solution[example_value]
+            if example_value not in culprits:
+                # this choice played no part in the conflict, jump back past it
+                self.unsolved.insert(0, example_value)
+                return culprits
+            conflict |= culprits
+        self.unsolved.insert(0, example_value)
+        conflict |= self._reasons([example_value])
+        conflict.discard(example_value)
+        return conflict
+
+    def _propagate(self, source: str, value: Any, reason: frozenset, trail: list[str]) -> set[str] | None:
+        """
+        Removes value from the options of all unsolved example values other
+        than source, including any options that become forced as a result.
+        Returns None if all example values still have options left, otherwise
+        the set of choices that depleted the example value that ran out.
+        """
+        queue = [(source, value, reason)]
+        while queue:
+            source, value, reason = queue.pop()
+            for other in self.unsolved:
+                if other == source or not self.domains[other].discard(value):
+                    continue
+                self.removals[other].append((value, reason))
+                trail.append(other)
+                remaining = len(self.domains[other])
+                if remaining <= 1:
+                    cause = self._reasons([other])
+                    if not remaining:
+                        return cause
+                    queue.append((other, self.domains[other].optionset[0], frozenset(cause)))
+        return None
+
+    def _reasons(self, example_values: list[str]) -> set[str]:
+        """The choices that caused options to be removed from these example values"""
+        return {choice for e in example_values for _, reason in self.removals[e] for choice in reason}
+
+    def _undo(self, trail: list[str]):
+        for example_value in reversed(trail):
+            value, _ = self.removals[example_value].pop()
+            self.domains[example_value].restore(value)
+
+
+class OptionUniverse:
+    """
+    Interns option values, giving each distinct value a fixed position. A set
+    of options can then be stored as an integer bitmask over these positions,
+    making intersection, removal and membership tests single operations, also
+    for option sets of thousands of values. Positions are handed out in order
+    of first appearance, which keeps iteration deterministic for seeding.
+    """
+
+    def __init__(self):
+        self.values: list[Any] = []
+        self.index: dict[Any, int] = {}
+
+    def mask_of(self, options: Iterable[Any], add: bool = False) -> int:
+        """
+        Returns the bitmask for options. Unknown values are added to the
+        universe when add is set, otherwise they are left out.
+        """
+        mask = 0
+        for option in options:
+            try:
+                pos = self.index.get(option)
+            except TypeError:
+                if add:
+                    raise
+                continue
+            if pos is None:
+                if not add:
+                    continue
+                pos = self.index[option] = len(self.values)
+                self.values.append(option)
+            mask |= 1 << pos
+        return mask
+
+    def bit_of(self, option: Any) -> int:
         try:
-            # Keep the items in optionset unique. Refrain from using Python sets
-            # due to non-deterministic behaviour when using random seeding.
-            self.optionset: list[Any] | None = list(dict.fromkeys(constraint))
+            pos = self.index.get(option)
         except TypeError:
-            self.optionset: list[Any] | None = None
-        if not self.optionset or isinstance(constraint, str):
+            return 0
+        return 0 if pos is None else 1 << pos
+
+    def options_in(self, mask: int) -> list[Any]:
+        return [self.values[pos] for pos in self.positions(mask)]
+
+    @staticmethod
+    def positions(mask: int) -> list[int]:
+        return [pos for pos, bit in enumerate(reversed(bin(mask)[2:])) if bit == '1']
+
+
+class Excluding:
+    """
+    Constraint that accepts any option, except for the listed ones. Since it
+    does not list options of its own, it can only narrow down the options of
+    an example value that already has a constraint.
+    """
+
+    def __init__(self, options: Iterable[Any]):
+        self.options = list(options)
+
+    def __repr__(self):
+        return f"Excluding({self.options})"
+
+
+class Constraint:
+    """
+    The remaining options for a single example value. Options are stored as a
+    bitmask over an OptionUniverse. Integer ranges are the exception. These are
+    kept as a range plus the set of values excluded from it, so that a range of
+    a million numbers never has to be expanded into a list.
+    """
+
+    def __init__(self, constraint: list[Any] | range, universe: OptionUniverse | None = None):
+        self.universe = universe if universe is not None else OptionUniverse()
+        self.mask = 0
+        self.range: range | None = None
+        self.excluded: set[int] = set()
+        if isinstance(constraint, range):
+            self.range = _ascending(constraint)
+        elif not isinstance(constraint, (str, Excluding)):
+            try:
+                self.mask = self.universe.mask_of(constraint, add=True)
+            except TypeError:
+                pass
+        if not len(self):
             raise ValueError(f"Invalid option set for initial constraint: {constraint}")
 
-        self.removed_stack: list[str | Placeholder] = []
+        self.removed_stack: list[Any] = []
+
+    @property
+    def optionset(self) -> list[Any]:
+        """The remaining options, in order of first appearance. Note that this expands ranges."""
+        if self.range is not None:
+            return [v for v in self.range if v not in self.excluded]
+        return self.universe.options_in(self.mask)
 
     def __repr__(self):
+        if self.range is not None:
+            excluded = f" excluding {sorted(self.excluded)}" if self.excluded else ""
+            return f"Constraint({self.range}{excluded})"
         return f'Constraint([{", ".join([str(e) for e in self.optionset])}])'
 
     def __iter__(self):
         return iter(self.optionset)
 
+    def __len__(self):
+        if self.range is not None:
+            return len(self.range) - len(self.excluded)
+        return self.mask.bit_count()
+
+    def __contains__(self, option: Any):
+        if self.range is not None:
+            return option in self.range and option not in self.excluded
+        return bool(self.universe.bit_of(option) & self.mask)
+
     def copy(self):
-        return Constraint(self.optionset)
+        new = Constraint.__new__(Constraint)
+        new.universe = self.universe
+        new.mask = self.mask
+        new.range = self.range
+        new.excluded = self.excluded.copy()
+        new.removed_stack = []
+        return new
 
-    def add_constraint(self, constraint: list[Any] | None):
+    def add_constraint(self, constraint: list[Any] | range | Excluding | None):
         if constraint is None:
             return
-        self.optionset = [opt for opt in self.optionset if opt in constraint]
-        if not len(self.optionset):
+        if isinstance(constraint, Excluding):
+            for option in constraint.options:
+                self.discard(option)
+        elif self.range is None:
+            if isinstance(constraint, range):
+                self.mask = self.universe.mask_of([opt for opt in self.optionset if opt in constraint])
+            else:
+                self.mask &= self.universe.mask_of(constraint)
+        elif isinstance(constraint, range):
+            self.range = _intersect_ranges(self.range, _ascending(constraint))
+            self.excluded = {v for v in self.excluded if v in self.range}
+        else:
+            # A listed set of options is never larger than the list itself
+            self.mask = self.universe.mask_of([opt for opt in constraint if opt in self], add=True)
+            self.range = None
+            self.excluded = set()
+        if not len(self):
             raise ValueError('No options left after adding constraint')
 
+    def discard(self, option: Any) -> bool:
+        """Removes option, if available. Returns whether it was."""
+        if self.range is not None:
+            if option not in self:
+                return False
+            self.excluded.add(option)
+            return True
+        bit = self.universe.bit_of(option) & self.mask
+        self.mask ^= bit
+        return bool(bit)
+
+    def restore(self, option: Any):
+        """Puts back an option that was taken out using discard()"""
+        if self.range is not None:
+            self.excluded.discard(option)
+        else:
+            self.mask |= self.universe.bit_of(option)
+
     def remove_option(self, option: str):
-        try:
-            self.optionset.remove(option)
-            self.removed_stack.append(option)
-        except ValueError:
-            self.removed_stack.append(Placeholder)
-        if not len(self.optionset):
+        self.removed_stack.append(option if self.discard(option) else Placeholder)
+        if not len(self):
             raise ValueError('No options left after adding constraint')
 
     def undo_remove(self):
         last_item = self.removed_stack.pop()
-        if last_item is not Placeholder and last_item not in self.optionset:
-            self.optionset.append(last_item)
+        if last_item is not Placeholder:
+            self.restore(last_item)
+
+    def pick(self, tried: set[Any]) -> Any | None:
+        """Picks a random option that is not in tried. Returns None if there is none left."""
+        if self.range is None:
+            options = [opt for opt in self.optionset if opt not in tried]
+            return randomiser.generator().choice(options) if options else None
+        remaining = len(self) - len([t for t in tried if t in self])
+        if not remaining:
+            return None
+        if 2*remaining > len(self.range):
+            # Most of the range is still available, so random draws hit quickly
+            while True:
+                value = self.range[randomiser.generator().randrange(len(self.range))]
+                if value not in self.excluded and value not in tried:
+                    return value
+        return randomiser.generator().choice([v for v in self.range if v not in self.excluded and v not in tried])
 
 
 class Placeholder:
     """For when None isn't specific enough"""
+
+
+def _ascending(r: range) -> range:
+    return r[::-1] if r.step < 0 else r
+
+
+def _intersect_ranges(a: range, b: range) -> range:
+    """Intersection of two ascending ranges, as a range"""
+    step = lcm(a.step, b.step)
+    start = max(a.start, b.start)
+    stop = min(a.stop, b.stop)
+    first_in_a = a.start + max(0, -(-(start - a.start) // a.step)) * a.step
+    for candidate in range(first_in_a, min(stop, first_in_a + step), a.step):
+        if (candidate - b.start) % b.step == 0:
+            return range(candidate, stop, step)
+    return range(0)
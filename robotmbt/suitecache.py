@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+# BSD 3-Clause License
+#
+# Copyright (c) 2026, J. Foederer
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import hashlib
+import json
+import os
+import pickle
+import sys
+from collections.abc import Iterator
+from pathlib import Path
+
+import robot
+import robot.running.model as rmodel
+from robot.api import logger
+
+from .suitedata import Suite, Scenario
+from .version import VERSION
+
+
+class SuiteCache:
+    """
+    Stores analysed test suites on disk, so that later runs can skip keyword resolution,
+    argument validation and model info parsing. The cached structure holds all suites,
+    scenarios and steps, including their model info and arguments. Entries are keyed on
+    the content of the Robot test suite, the libraries and resources it draws its keywords
+    from, and the versions of Python, Robot Framework and RobotMBT. A change in any of
+    these results in a new key, so that outdated entries are never used.
+    """
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+
+    def key(self, in_suite: rmodel.TestSuite, namespace) -> str:
+        """namespace must be Robot Framework's namespace that resolves the keywords for in_suite"""
+        digest = hashlib.sha256()
+        for version in (VERSION, robot.version.VERSION, sys.version):
+            digest.update(version.encode())
+        digest.update(json.dumps(in_suite.to_dict(), sort_keys=True, default=str).encode())
+        for library in namespace.libraries:
+            digest.update(f"{library.name} {library.version}".encode())
+            # The keywords are hashed rather than the library's source file, because a library can
+            # span multiple modules. Only the keywords' interface and documentation matter to the analysis.
+            for kw in library.keywords:
+                digest.update(json.dumps([kw.name, str(kw.args), kw.doc, sorted(kw.tags)]).encode())
+        for resource in _imported_resources(namespace):
+            _update_with_file(digest, resource.source)
+        return digest.hexdigest()
+
+    def load(self, key: str, in_suite: rmodel.TestSuite) -> Suite | None:
+        """Returns the cached suite for key, or None if there is no usable entry"""
+        try:
+            with open(self._path(key), 'rb') as f:
+                return _SuiteUnpickler(f, in_suite).load()
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            logger.info(f"Ignoring unusable suite cache entry {self._path(key)}: {err}")
+            return None
+
+    def store(self, key: str, suite: Suite):
+        path = self._path(key)
+        temp_path = path.with_suffix('.tmp')
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                _SuitePickler(f, suite).dump(suite)
+            os.replace(temp_path, path)  # Never leave a partially written entry
+        except Exception as err:
+            logger.info(f"Suite analysis not cached: {err}")
+            temp_path.unlink(missing_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pickle"
+
+
+class _SuitePickler(pickle.Pickler):
+    """
+    Robot's test cases, as kept by scenarios, are not stored. They are referenced by their
+    position in the suite instead, to be reconnected to the live test cases when loading.
+    """
+
+    def __init__(self, file, suite: Suite):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.test_positions = {id(scenario.og_tc): pos for pos, scenario in enumerate(_scenarios(suite))}
+
+    def persistent_id(self, obj):
+        if isinstance(obj, rmodel.TestCase):
+            return self.test_positions[id(obj)]
+        return None
+
+
+class _SuiteUnpickler(pickle.Unpickler):
+    def __init__(self, file, in_suite: rmodel.TestSuite):
+        super().__init__(file)
+        self.tests = list(_tests(in_suite))
+
+    def persistent_load(self, pid: int):
+        # Same reduced copy as taken when creating the scenario
+        return self.tests[pid].copy(body=[], parent=None, _setup=None, _teardown=None)
+
+
+def _scenarios(suite: Suite) -> Iterator[Scenario]:
+    for subsuite in suite.suites:
+        yield from _scenarios(subsuite)
+    yield from suite.scenarios
+
+
+def _tests(in_suite: rmodel.TestSuite) -> Iterator[rmodel.TestCase]:
+    for subsuite in in_suite.suites:
+        yield from _tests(subsuite)
+    yield from in_suite.tests
+
+
+def _imported_resources(namespace) -> Iterator:
+    # Robot Framework's namespace does not expose its imported resource files publicly
+    return namespace._kw_store.resources.values()
+
+
+def _update_with_file(digest, source: str | Path | None):
+    digest.update(str(source).encode())
+    if source and os.path.isfile(source):
+        with open(source, 'rb') as f:
+            digest.update(f.read())
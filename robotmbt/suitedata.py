@@ -31,6 +31,7 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import copy
+from functools import lru_cache
 from typing import Literal
 
 from robot.errors import TimeoutExceeded  # Raised by Robot in case of keyword timeout
@@ -74,6 +75,8 @@ class Suite:
 
 
 class Scenario:
+    __slots__ = ('name', 'og_tc', 'parent', 'setup', 'teardown', 'steps', 'src_id', 'data_choices')
+
     def __init__(self, name: str, parent: Suite, og_tc):
         self.name: str = name
         # Keeping any keyword references in the copy of the original test case has a large
@@ -103,8 +106,12 @@ class Scenario:
                 + ([self.teardown] if self.teardown and self.teardown.has_error() else []))
 
     def copy(self):
+        """
+        Steps are shared between copies. Code that modifies a step of a
+        copied scenario must replace that step by a copy of its own first.
+        """
         duplicate = copy.copy(self)
-        duplicate.steps = [step.copy() for step in self.steps]
+        duplicate.steps = list(self.steps)
         duplicate.data_choices = self.data_choices.copy()
         return duplicate
 
@@ -125,6 +132,9 @@ class Scenario:
 
 
 class Step:
+    __slots__ = ('org_step', 'org_pn_args', 'parent', 'assign', '_gherkin_kw', 'signature', 'args', 'detached',
+                 'model_info')
+
     def __init__(self, steptext: str, *args, parent: Suite | Scenario, assign: tuple[str] = (),
                  prev_gherkin_kw: Literal['given', 'when', 'then'] | None = None):
         # org_step is the first keyword cell of the Robot line, including step_kw,
@@ -238,12 +248,18 @@ class Step:
                                                robot_kw.embedded.parse_args(self.kw_wo_gherkin))])
             self.args += self.__handle_non_embedded_arguments(robot_kw.args)
             self.signature = robot_kw.name
-            self.model_info = self.__parse_model_info(robot_kw._doc)
+            self.model_info = {key: value[:] for key, value in self.__parse_model_info(robot_kw._doc).items()}
         except TimeoutExceeded:
             raise
         except Exception as ex:
             self.model_info['error'] = str(ex)
 
+    def copy_robot_dependent_data(self, other: 'Step'):
+        """Takes over the keyword dependent data from an identical step that was already analysed"""
+        self.args = StepArguments(other.args)
+        self.signature = other.signature
+        self.model_info = {key: value[:] for key, value in other.model_info.items()}
+
     def __handle_non_embedded_arguments(self, robot_argspec: ArgumentSpec) -> list[StepArgument]:
         result = []
         p_args = [a for a in self.org_pn_args if '=' not in a or r'\=' in a]
@@ -297,7 +313,13 @@ class Step:
         # Use the Robot mechanism for validation to yield familiar error messages
         ArgumentValidator(spec).validate(p, n)
 
-    def __parse_model_info(self, docu: str) -> dict[str, list[str]]:
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def __parse_model_info(docu: str) -> dict[str, list[str]]:
+        """
+        Parsed once per distinct documentation text. The result, including its lists of expressions,
+        is shared, so callers must copy it in full.
+        """
         model_info = dict()
         mi_index = docu.find("*model info*")
         if mi_index == -1:
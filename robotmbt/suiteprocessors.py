@@ -31,16 +31,25 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import copy
+import io
+import multiprocessing
+import pickle
 import random
+import threading
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 from robot.api import logger
 from robot.errors import TimeoutExceeded
-from robot.utils import timestr_to_secs
+from robot.utils import is_truthy, timestr_to_secs
 
-from . import modeller
+from . import modeller, randomiser
+from .candidatescoring import CandidateScorer, SCORERS
+from .dependencygraph import DependencyGraph
+from .lazylogger import debug, is_debug_enabled
 from .modelspace import ModelSpace
-from .suitedata import Suite, Scenario
+from .suitedata import Suite, Scenario, Step
 from .tracestate import TraceState
 
 try:
@@ -138,37 +147,85 @@ class Flatten(SuiteProcessor):
 
     @staticmethod
     def flatten(in_suite: Suite) -> Suite:
-        out_suite = copy.deepcopy(in_suite)
-        outer_scenarios = out_suite.scenarios
-        for scenario in outer_scenarios:
-            if scenario.setup:
-                scenario.steps.insert(0, scenario.setup)
-                scenario.setup = None
-            if scenario.teardown:
-                scenario.steps.append(scenario.teardown)
-                scenario.teardown = None
-        out_suite.scenarios = []
-        for suite in in_suite.suites:
-            subsuite = Flatten.flatten(suite)
-            for scenario in subsuite.scenarios:
-                if subsuite.setup:
-                    scenario.steps.insert(0, subsuite.setup)
-                if subsuite.teardown:
-                    scenario.steps.append(subsuite.teardown)
-            out_suite.scenarios.extend(subsuite.scenarios)
-        out_suite.scenarios.extend(outer_scenarios)
+        """
+        Steps are shared with the input suite, only the suite and scenario objects are new.
+        The setup and teardown of the top level suite are kept on the output suite.
+        """
+        out_suite = copy.copy(in_suite)
         out_suite.suites = []
+        out_suite.scenarios = Flatten._flat_scenarios(in_suite, [], [])
         return out_suite
 
+    @staticmethod
+    def _flat_scenarios(suite: Suite, setups: list[Step], teardowns: list[Step]) -> list[Scenario]:
+        scenarios = []
+        for subsuite in suite.suites:
+            scenarios.extend(Flatten._flat_scenarios(subsuite,
+                                                     setups + ([subsuite.setup] if subsuite.setup else []),
+                                                     ([subsuite.teardown] if subsuite.teardown else []) + teardowns))
+        for scenario in suite.scenarios:
+            flat_scenario = scenario.copy()
+            flat_scenario.steps = (setups + ([scenario.setup] if scenario.setup else [])
+                                   + scenario.steps
+                                   + ([scenario.teardown] if scenario.teardown else []) + teardowns)
+            flat_scenario.setup = None
+            flat_scenario.teardown = None
+            scenarios.append(flat_scenario)
+        return scenarios
+
 
 class ModelBased(SuiteProcessor):
+    # Number of scenarios without new coverage before giving up on a trace. The actual limit
+    # is adapted to the progress of the trace, within the minimum and maximum (see _drought_limit).
+    DROUGHT_LIMIT = 50
+    MIN_DROUGHT_LIMIT = 10
+    MAX_DROUGHT_LIMIT = 500
+
     def process_test_suite(self, in_suite: Suite, *, seed: str | int | bytes | bytearray = 'new',
-                           batch_size: str | int = 100,
+                           batch_size: str | int = 100, workers: str | int = 1, pregenerate: str | bool = False,
+                           strategy: str = 'rewind', beam_width: str | int = 10, scoring: str = '',
                            graph: str = '', export_graph_data: str = '', **kwargs) -> Suite:
+        """
+        Composes the trace of scenarios for the output suite. The options are described in the README.
+
+        The same seed reproduces the same trace for the same options. Note that the number of workers
+        is part of that: a single worker (workers=1) explores the priority orders interleaved with
+        suggestions from earlier attempts, whereas multiple workers run all priority orders in parallel,
+        each with its own seed. For the same seed, workers=1 and workers=N can give different traces,
+        but any N above 1 gives the same trace.
+        """
         # handle options
         super().process_test_suite(in_suite, **kwargs)
         self.batch_size = int(batch_size)
+        self.workers = int(workers)
+        if self.workers < 1:
+            logger.warn(f"Unsupported number of workers '{workers}'. Using a single worker.")
+            self.workers = 1
+        self.pregenerate = is_truthy(pregenerate)
+        self.strategy = str(strategy).lower()
+        if self.strategy not in ('rewind', 'beam'):
+            logger.warn(f"Unsupported strategy '{strategy}'. Using the rewind strategy.")
+            self.strategy = 'rewind'
+        self.beam_width = int(beam_width)
+        if self.beam_width < 1:
+            logger.warn(f"Unsupported beam width '{beam_width}'. Using a beam width of 10.")
+            self.beam_width = 10
+        self._recent_attempts: deque[bool] = deque(maxlen=100)  # Outcomes of the latest insertion attempts
+        self._scorer: CandidateScorer | None = None
+        if scoring and str(scoring).lower() != 'none':
+            if str(scoring).lower() in SCORERS:
+                self._scorer = SCORERS[str(scoring).lower()]()
+            else:
+                logger.warn(f"Unsupported scoring '{scoring}'. Using random candidate selection.")
+        self._pregenerator: threading.Thread | None = None
+        self._pregeneration: ModelBased | None = None  # Generates the next batch in the background
+        self._pregenerated: TraceState | BaseException | None = None
+        self._batch_random: random.Random | None = None
         self._init_randomiser(seed)
+        # Memoises insertion outcomes per model state and scenario variant, for states that are revisited
+        self._transpositions = modeller.LRUCache(maxsize=4096)
+        # Memoises the constraints collected from modifiers per scenario and model state
+        self._collected_constraints = modeller.LRUCache(maxsize=4096)
         self._visualiser = self._init_visualiser(in_suite.name) if graph or export_graph_data else None
 
         self.out_suite = Suite(in_suite.name)
@@ -179,8 +236,10 @@ class ModelBased(SuiteProcessor):
         for id, scenario in enumerate(self.flat_suite.scenarios, start=1):
             scenario.src_id = id
         self.scenarios: list[Scenario] = self.flat_suite.scenarios[:]
-        logger.debug("Use these numbers to reference scenarios from traces\n\t" +
-                     "\n\t".join([f"{s.src_id}: {s.name}" for s in self.scenarios]))
+        self._scenarios_by_id: dict[int, Scenario] = {s.src_id: s for s in self.scenarios}
+        debug(lambda: "Use these numbers to reference scenarios from traces\n\t" +
+                      "\n\t".join([f"{s.src_id}: {s.name}" for s in self.scenarios]))
+        self._dependencies = DependencyGraph(self.scenarios)
 
         try:
             # a short trace without the need for repeating scenarios is preferred
@@ -188,7 +247,7 @@ class ModelBased(SuiteProcessor):
             if self._discovery_ready(direct_tracestate):
                 self.tracestate = direct_tracestate
                 n = len(direct_tracestate.covered_ids)
-                logger.debug(f"Using one of the discovered traces ({n} scenario{'s' if n != 1 else ''})")
+                debug(lambda: f"Using one of the discovered traces ({n} scenario{'s' if n != 1 else ''})")
                 self._report_tracestate_to_user(direct_tracestate)
                 # The visualiser assumes that the last trace is the final selected trace, which is not always
                 # the case. Re-initialising and then adding the selected trace again prevents the wrong path
@@ -198,7 +257,7 @@ class ModelBased(SuiteProcessor):
             else:
                 self.tracestate = TraceState([s.src_id for s in self.scenarios])
                 self.tracestate.unreached = direct_tracestate.unreached
-                logger.debug("Direct trace not discovered. Now exploring with loops, allowing repetition of scenarios.")
+                debug("Direct trace not discovered. Now exploring with loops, allowing repetition of scenarios.")
                 self._generate_next_batch(self.batch_size)
         finally:  # Draw the graph even when a timeout or user interrupt occurs
             if graph:
@@ -207,16 +266,78 @@ class ModelBased(SuiteProcessor):
                 self._export_graph_data(export_graph_data)
         if len(self.tracestate) == 0:
             raise Exception("Unable to compose a consistent suite")
+        # Later batches draw from their own generator, seeded from the run's random state. Keywords using
+        # random numbers then do not affect these batches, whether they are generated in the background or not.
+        self._batch_random = random.Random(random.getrandbits(64))
         self._report_tracestate_wrapup()
         return self.out_suite
 
     def next_scenario_request(self):
         if len(self.tracestate) <= self.out_suite.scenario_count():
-            self._generate_next_batch(self.batch_size)
+            if self._pregenerator:
+                self._collect_pregenerated_batch()
+            else:
+                with randomiser.using(self._batch_random):
+                    self._generate_next_batch(self.batch_size)
         if len(self.tracestate) > self.out_suite.scenario_count():
             self.out_suite.scenarios.append(self.tracestate[self.out_suite.scenario_count()].scenario)
             self.commit_count += 1
             self.tracestate.rewind_limit += 1
+        if self.pregenerate:
+            self._start_pregeneration()
+
+    def _start_pregeneration(self):
+        """
+        Starts generating the next batch in a background thread, while the pending scenarios are
+        being executed. Generation runs on a copy of the trace, in which all current scenarios are
+        treated as committed. This is the same starting point as when the batch would be generated
+        once the pending scenarios run out, but without stalling test execution.
+
+        The background thread runs on a copy of this processor, with its own caches, scorer and
+        attempt history. The main thread's are not touched until the batch is collected, when they
+        are replaced by those of the copy. Like batches that are not pre-generated, the batch draws
+        from the batch random generator. The same seed therefore gives the same trace, with or
+        without pregeneration.
+
+        Note that Robot only logs from the main thread, so detailed debug logging of pre-generated
+        batches is not available.
+        """
+        if self._pregenerator or self.are_all_targets_reached(self.tracestate, committed_only=False):
+            return
+        tracestate = self.tracestate.copy()
+        tracestate.rewind_limit = len(tracestate)
+        self._pregeneration = copy.copy(self)
+        self._pregeneration._transpositions = self._transpositions.copy()
+        self._pregeneration._collected_constraints = self._collected_constraints.copy()
+        self._pregeneration._recent_attempts = self._recent_attempts.copy()
+        self._pregeneration._scorer = copy.deepcopy(self._scorer)
+        self._pregeneration._visualiser = None
+        self._pregenerator = threading.Thread(target=self._pregeneration._pregenerate_next_batch, args=(tracestate,),
+                                              name='RobotMBT pregeneration', daemon=True)
+        self._pregenerator.start()
+
+    def _pregenerate_next_batch(self, tracestate: TraceState):
+        try:
+            with randomiser.using(self._batch_random):
+                self._pregenerated = self._generate_next_batch(self.batch_size, tracestate)
+        except BaseException as err:  # handed over to the main thread
+            self._pregenerated = err
+
+    def _collect_pregenerated_batch(self):
+        while self._pregenerator.is_alive():
+            # Waiting in short intervals keeps the main thread responsive to Robot's timeouts
+            self._pregenerator.join(0.1)
+        background = self._pregeneration
+        result = background._pregenerated
+        self._pregenerator = self._pregeneration = None
+        self._transpositions = background._transpositions
+        self._collected_constraints = background._collected_constraints
+        self._recent_attempts = background._recent_attempts
+        self._scorer = background._scorer
+        if isinstance(result, BaseException):
+            raise result
+        result.rewind_limit = self.tracestate.rewind_limit
+        self.tracestate = result
 
     @property
     def scenarios_committed(self) -> int:
@@ -266,46 +387,56 @@ class ModelBased(SuiteProcessor):
 
         If visualisation is inactive, then the first discovered full direct trace is returned.
         If visualisation is active, then the first phase is always completed before returning.
+
+        With multiple workers, the first phase runs in parallel (see _discover_in_parallel).
         """
         MAX_LOOPCOUNT = 7
+        self._reset_discovery_bookkeeping()
         id_list = [s.src_id for s in self.scenarios]
         loopcount = min(MAX_LOOPCOUNT, len(id_list))
         random.shuffle(id_list)  # pre-shuffle to prevent scenario 1 from always getting first prio
         prio_chunks = [id_list[i::loopcount] for i in range(loopcount)]
         tracestates = []
-        for prio_ids in prio_chunks:
-            prio_order = prio_ids
-            other_scenarios = [s for s in id_list if s not in prio_ids]
-            random.shuffle(other_scenarios)
-            prio_order += other_scenarios
-            if self._is_duplicate_prio_order(tracestates, prio_order):
-                continue
-            tracestates.append(self._one_shot_trace(prio_order))
-            if self._discovery_ready(tracestates[-1]) and not self._visualiser:
-                tracestates[-1].unreached = self._unreached_scenarios(tracestates)
-                return tracestates[-1]
-            suggestion = self._create_suggestion_by_experience(tracestates)
-            if self._is_duplicate_prio_order(tracestates, suggestion):
-                continue
-            tracestates.append(self._one_shot_trace(suggestion))
-            if self._discovery_ready(tracestates[-1]) and not self._visualiser:
-                tracestates[-1].unreached = self._unreached_scenarios(tracestates)
-                return tracestates[-1]
+        if self.workers > 1 and not self._visualiser:
+            tracestates = self._discover_in_parallel(id_list, prio_chunks)
+            ready = next((ts for ts in tracestates if self._discovery_ready(ts)), None)
+            if ready:
+                ready.unreached = self._unreached_scenarios(tracestates)
+                return ready
+        else:
+            for prio_ids in prio_chunks:
+                prio_order = prio_ids
+                other_scenarios = [s for s in id_list if s not in prio_ids]
+                random.shuffle(other_scenarios)
+                prio_order += other_scenarios
+                if not self._is_new_prio_order(prio_order):
+                    continue
+                tracestates.append(self._one_shot_trace(prio_order))
+                if self._discovery_ready(tracestates[-1]) and not self._visualiser:
+                    tracestates[-1].unreached = self._unreached_scenarios(tracestates)
+                    return tracestates[-1]
+                suggestion = self._create_suggestion_by_experience(tracestates)
+                if not self._is_new_prio_order(suggestion):
+                    continue
+                tracestates.append(self._one_shot_trace(suggestion))
+                if self._discovery_ready(tracestates[-1]) and not self._visualiser:
+                    tracestates[-1].unreached = self._unreached_scenarios(tracestates)
+                    return tracestates[-1]
 
         index_longest = self._longest_trace(tracestates)
         if self._discovery_ready(tracestates[index_longest]):
             tracestates[index_longest].unreached = self._unreached_scenarios(tracestates)
             return tracestates[index_longest]
-        logger.debug("Trying to extend most promising traces")
+        debug("Trying to extend most promising traces")
         prio_order = self._create_suggestion_by_experience(tracestates, index_longest)
-        if not self._is_duplicate_prio_order(tracestates, prio_order):
+        if self._is_new_prio_order(prio_order):
             tracestates.append(self._one_shot_trace(prio_order))
             if self._discovery_ready(tracestates[-1]):
                 return tracestates[-1]
         last_new = self._last_new_coverage(tracestates)
         while True:  # while still discovering new coverage
             prio_order = self._create_suggestion_by_experience(tracestates, last_new)
-            if self._is_duplicate_prio_order(tracestates, prio_order):
+            if not self._is_new_prio_order(prio_order):
                 break
             tracestates.append(self._one_shot_trace(prio_order))
             if self._discovery_ready(tracestates[-1]):
@@ -317,14 +448,76 @@ class ModelBased(SuiteProcessor):
         longest = tracestates[self._longest_trace(tracestates)]
         not_in_trace = sorted(longest.not_in_trace)
         longest.unreached = self._unreached_scenarios(tracestates)
-        logger.debug(
-            f"Longest trace so far ({len(longest.covered_ids)} scenario{'s' if len(longest.covered_ids) != 1 else ''})"
-            f": [{', '.join(longest.id_trace)}]\n"
-            f"{len(not_in_trace)} Scenario{'s' if len(not_in_trace) != 1 else ''} not in this trace: "
-            f": [{', '.join([str(i) + '*' if i in longest.unreached else str(i) for i in not_in_trace])}] "
-            "(Scenarios marked with * are not part of any trace)\n\n")
+        n = len(longest.covered_ids)
+        debug(lambda: f"Longest trace so far ({n} scenario{'s' if n != 1 else ''})"
+                      f": [{', '.join(longest.id_trace)}]\n"
+                      f"{len(not_in_trace)} Scenario{'s' if len(not_in_trace) != 1 else ''} not in this trace: "
+                      f": [{', '.join([str(i) + '*' if i in longest.unreached else str(i) for i in not_in_trace])}] "
+                      "(Scenarios marked with * are not part of any trace)\n\n")
         return longest
 
+    def _reset_discovery_bookkeeping(self):
+        self._known_prio_orders: set[tuple[int, ...]] = set()
+        self._ids_seen: set[int] = set()
+        self._traces_seen = 0
+        self._latest_new_coverage = 0
+
+    def _discover_in_parallel(self, id_list: list[int], prio_chunks: list[list[int]]) -> list[TraceState]:
+        """
+        Parallel variant of the first discovery phase. All prio orders are composed up front and their
+        one-shot traces are run in a pool of worker processes. A second round runs the suggestions by
+        experience, based on the outcome of the first round.
+
+        Each one-shot trace gets its own seed, drawn in a fixed order from the run's random seed, and
+        results are merged in the order in which they were requested. The outcome therefore only
+        depends on the seed, not on which worker finishes first.
+        """
+        prio_orders = []
+        for prio_ids in prio_chunks:
+            other_scenarios = [s for s in id_list if s not in prio_ids]
+            random.shuffle(other_scenarios)
+            prio_orders.append(prio_ids + other_scenarios)
+        worker_settings = dict(scenarios=self.scenarios, _scenarios_by_id=self._scenarios_by_id,
+                               batch_size=self.batch_size,
+                               coverage_target=self.coverage_target, scenario_target=self.scenario_target,
+                               time_target=self.time_target, _dependencies=self._dependencies)
+        # Robot's test cases stay in this process. Workers get a reference to them instead.
+        test_cases = {id(s.og_tc): ('og_tc', s.src_id) for s in self.scenarios if s.og_tc is not None}
+        settings_data = _dumps(worker_settings, lambda obj: test_cases.get(id(obj)))
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_discovery_worker, initargs=(settings_data,))
+        try:
+            tracestates = self._one_shot_traces_in_pool(pool, prio_orders)
+            suggestions = [self._create_suggestion_by_experience(tracestates[:i+1]) for i in range(len(tracestates))]
+            tracestates += self._one_shot_traces_in_pool(pool, suggestions)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        return tracestates
+
+    def _one_shot_traces_in_pool(self, pool: ProcessPoolExecutor, prio_orders: list[list[int]]) -> list[TraceState]:
+        jobs = []
+        for prio_order in prio_orders:
+            if not self._is_new_prio_order(prio_order):
+                continue
+            jobs.append((prio_order, random.getrandbits(64)))
+        futures = [pool.submit(_one_shot_trace_in_worker, prio_order, seed) for prio_order, seed in jobs]
+        shared = _shared_objects(self.scenarios)
+        tracestates = []
+        for (prio_order, seed), future in zip(jobs, futures):
+            try:
+                tracestate = _loads(future.result(), shared.__getitem__)
+            except Exception as err:
+                # E.g. when the model holds values that cannot be passed between processes
+                debug(lambda: f"Discovery with prio order {prio_order} failed in worker process, "
+                              f"running it locally instead. {err}")
+                tracestate = self._one_shot_trace(prio_order, seed)
+            else:
+                n = len(tracestate.covered_ids)
+                debug(lambda: f"Discovered trace with prio order {prio_order} ({n} scenario{'s' if n != 1 else ''}): "
+                              f"[{', '.join(tracestate.id_trace)}]")
+            tracestates.append(tracestate)
+        return tracestates
+
     def _discovery_ready(self, tracestate):
         return self.are_all_targets_reached(tracestate, committed_only=False) or len(tracestate) >= self.batch_size
 
@@ -339,51 +532,69 @@ class ModelBased(SuiteProcessor):
         been reached before. The idea behind this is that maybe this last insertion was most
         difficult to reach and this trace may contain a unique sequence for reaching that
         scenario.
-        """
-        ids = []
-        latest_new = 0
-        for index, tracestate in enumerate(tracestate_list):
-            for id in [int(float(long_id)) for long_id in tracestate.id_trace]:
-                if id not in ids:
-                    ids.append(id)
-                    latest_new = index
-        return latest_new
 
-    @staticmethod
-    def _is_duplicate_prio_order(tracestate_list: list[TraceState], candidate_order) -> bool:
-        return any(ts.prio_order == candidate_order for ts in tracestate_list)
+        The list is only ever extended during discovery, so only traces that were added since
+        the previous call need to be indexed.
+        """
+        for index in range(self._traces_seen, len(tracestate_list)):
+            for long_id in tracestate_list[index].id_trace:
+                id = int(float(long_id))
+                if id not in self._ids_seen:
+                    self._ids_seen.add(id)
+                    self._latest_new_coverage = index
+        self._traces_seen = len(tracestate_list)
+        return self._latest_new_coverage
+
+    def _is_new_prio_order(self, prio_order: list[int]) -> bool:
+        """Checks whether a prio order was not tried before during discovery, and registers it as tried"""
+        key = tuple(prio_order)
+        if key in self._known_prio_orders:
+            return False
+        self._known_prio_orders.add(key)
+        return True
 
     @staticmethod
     def _unreached_scenarios(tracestate_list: list[TraceState]) -> list[int]:
         not_in_trace = [set(t.not_in_trace) for t in tracestate_list]
         return list(not_in_trace[0].intersection(*not_in_trace[1:]))
 
-    def _one_shot_trace(self, scenarios: list[int]) -> TraceState:
+    def _one_shot_trace(self, scenarios: list[int], seed: int | None = None) -> TraceState:
         """
         Given a list of scenario ids, construct a trace trying all scenarios in order until
         a full trace is created, or until a deadend is reached. No rollbacks are done.
+
+        When a seed is passed, the trace is generated using that seed, without affecting the
+        state of the run's random generator.
         """
-        logger.debug(f"Discovering with prio order {scenarios}")
+        if seed is not None:
+            random_state = random.getstate()
+            random.seed(seed)
+            try:
+                return self._one_shot_trace(scenarios)
+            finally:
+                random.setstate(random_state)
+        debug(lambda: f"Discovering with prio order {scenarios}")
         tracestate = TraceState(scenarios)
         self._update_visualisation(tracestate)
         candidate_id = tracestate.next_candidate(retry=False, randomise=False)
         while candidate_id is not None and not self._discovery_ready(tracestate):
             candidate = self._select_scenario_variant(candidate_id, tracestate)
             if candidate:  # No valid variant available in the current state
-                modeller.try_to_fit_in_scenario(candidate, tracestate)
+                modeller.try_to_fit_in_scenario(candidate, tracestate, self._transpositions)
             else:
                 tracestate.reject_scenario(candidate_id)
             self._update_visualisation(tracestate)
             candidate_id = tracestate.next_candidate(retry=False)
         n = len(tracestate.covered_ids)
-        logger.debug(f"Discovered trace ({n} scenario{'s' if n != 1 else ''}): [{', '.join(tracestate.id_trace)}]")
+        debug(lambda: f"Discovered trace ({n} scenario{'s' if n != 1 else ''}): [{', '.join(tracestate.id_trace)}]")
         return tracestate
 
     def _create_suggestion_by_experience(self, tracestate_list, target_index=-1) -> list[int]:
         """
         target_index is the index in tracestate_list to use as prior experience. The next
         suggestion is a prio order created using the following rules:
-          - First all never-reached scenarios in randomized order,
+          - First all never-reached scenarios in randomized order, those with the fewest
+            prerequisites (see DependencyGraph.depth) first,
           - then all scenarios that are reachable, but are not part of the prior experience,
           - and finally all scenarios (in order) that are part of the prior experience.
 
@@ -391,48 +602,154 @@ class ModelBased(SuiteProcessor):
         """
         never_reached = self._unreached_scenarios(tracestate_list)
         random.shuffle(never_reached)
+        never_reached.sort(key=self._dependencies.depth)
         not_in_target = [id for id in tracestate_list[target_index].not_in_trace if id not in never_reached]
         return never_reached + not_in_target + tracestate_list[target_index].covered_ids
 
-    def _generate_next_batch(self, batchsize):
-        tracestate = self.tracestate
+    def _generate_next_batch(self, batchsize: int, tracestate: TraceState | None = None) -> TraceState:
+        """Extends the trace by one batch. Uses the current trace, unless another tracestate is passed."""
+        if tracestate is None:
+            tracestate = self.tracestate
+        if self.strategy != 'beam':
+            return self._generate_batch_with_rewind(batchsize, tracestate)
+        # Beam search returns one of the extended copies, which then becomes the current trace
+        extended = self._generate_batch_by_beam_search(batchsize, tracestate)
+        if tracestate is self.tracestate:
+            self.tracestate = extended
+        return extended
+
+    def _generate_batch_with_rewind(self, batchsize: int, tracestate: TraceState) -> TraceState:
+        """
+        Extends the trace by randomly selecting scenarios that fit. When no scenario fits,
+        or when the trace goes too long without new coverage, the trace is rolled back to
+        try something else.
+        """
         old_len = len(tracestate)
         self._update_visualisation(tracestate)
-        while len(tracestate) < old_len + batchsize and not self.are_all_targets_reached(committed_only=False):
-            candidate_id = tracestate.next_candidate(retry=True, randomise=True)
+        while len(tracestate) < old_len + batchsize and not self.are_all_targets_reached(tracestate, committed_only=False):
+            predecessor = self._last_scenario_id(tracestate)
+            weigh = (lambda id: self._scorer.score(predecessor, id)) if self._scorer else None
+            candidate_id = tracestate.next_candidate(retry=True, randomise=True, weigh=weigh)
             if candidate_id is None:
-                logger.debug("No more candidates remaining at this position.")
+                debug("No more candidates remaining at this position.")
                 if not tracestate.can_rewind():
                     break
                 tail = modeller.rewind(tracestate)
-                logger.debug(f"Having to roll back up to {tail.scenario.name if tail else 'the beginning'}")
+                debug(lambda: f"Having to roll back up to {tail.scenario.name if tail else 'the beginning'}")
                 self._report_tracestate_to_user(tracestate)
                 if tracestate.model:
-                    logger.debug(f"last state:\n{tracestate.model.get_status_text()}")
+                    debug(lambda: f"last state:\n{tracestate.model.get_status_text()}")
             else:
                 candidate = self._select_scenario_variant(candidate_id, tracestate)
                 if not candidate:  # No valid variant available in the current state
                     tracestate.reject_scenario(candidate_id)
+                    self._recent_attempts.append(False)
+                    if self._scorer:
+                        self._scorer.record(predecessor, candidate_id, accepted=False)
                     self._update_visualisation(tracestate)
                     continue
                 previous_len = len(tracestate)
-                modeller.try_to_fit_in_scenario(candidate, tracestate)
+                first_reach = candidate_id in tracestate.unreached
+                modeller.try_to_fit_in_scenario(candidate, tracestate, self._transpositions)
+                accepted = len(tracestate) > previous_len
+                self._recent_attempts.append(accepted)
+                if self._scorer:
+                    self._scorer.record(predecessor, candidate_id, accepted, new_coverage=accepted and first_reach)
                 self._update_visualisation(tracestate)
                 if len(tracestate) > previous_len:
                     self._report_tracestate_to_user(tracestate)
-                    logger.debug(f"last state:\n{tracestate.model.get_status_text()}")
-                    self.DROUGHT_LIMIT = 50
+                    debug(lambda: f"last state:\n{tracestate.model.get_status_text()}")
                     if self.__last_candidate_changed_nothing(tracestate):
-                        logger.debug("Repeated scenario did not change the model's state. Stop trying.")
+                        debug("Repeated scenario did not change the model's state. Stop trying.")
                         modeller.rewind(tracestate)
-                    elif self.coverage_target and not self.tracestate.coverage_reached() and tracestate.coverage_drought > self.DROUGHT_LIMIT:
-                        logger.debug(f"Went too long without new coverage (>{self.DROUGHT_LIMIT}x). "
-                                     "Roll back to last coverage increase and try something else.")
+                    elif self._in_drought(tracestate):
+                        debug(lambda: f"Went too long without new coverage (>{self._drought_limit(tracestate)}x). "
+                                      "Roll back to last coverage increase and try something else.")
                         modeller.rewind(tracestate, drought_recovery=True)
                         self._report_tracestate_to_user(tracestate)
-                        logger.debug(f"last state:\n{tracestate.model.get_status_text()}")
+                        debug(lambda: f"last state:\n{tracestate.model.get_status_text()}")
             self._update_visualisation(tracestate)
         self._update_visualisation(tracestate)
+        return tracestate
+
+    def _generate_batch_by_beam_search(self, batchsize: int, tracestate: TraceState) -> TraceState:
+        """
+        Extends the trace by keeping the most promising traces (up to beam_width) and extending
+        all of them by one scenario at a time. The extensions are scored by the number of scenarios
+        they cover, and then by the number of never reached scenarios that are left. Extensions
+        are copies of their trace, so they share the snapshots of their common prefix.
+
+        When all traces in the beam run into a dead end, the best trace so far continues with
+        the rewind strategy to complete the batch.
+        """
+        target_len = len(tracestate) + batchsize
+        beam = [tracestate]
+        self._update_visualisation(tracestate)
+        while True:
+            done = next((ts for ts in beam if len(ts) >= target_len
+                         or self.are_all_targets_reached(ts, committed_only=False)), None)
+            if done:
+                return done
+            extensions = {}
+            for member in beam:
+                for candidate_id in member.next_candidates(retry=True):
+                    extension = self._extend_trace(member, candidate_id)
+                    if extension and not self._in_drought(extension):
+                        # Extensions that end up in the same situation are interchangeable
+                        key = (extension[-1].state_key, frozenset(extension.covered_ids),
+                               tuple(extension.active_refinements))
+                        extensions.setdefault(key, extension)
+            if not extensions:
+                debug("All traces in the beam ran into a dead end. Continuing from the best trace using rewinds.")
+                return self._generate_batch_with_rewind(target_len - len(beam[0]), beam[0])
+            beam = sorted(extensions.values(), key=self._beam_score, reverse=True)[:self.beam_width]
+            self._report_tracestate_to_user(beam[0])
+            self._update_visualisation(beam[0])
+
+    def _extend_trace(self, tracestate: TraceState, candidate_id: int) -> TraceState | None:
+        """
+        Returns a copy of the trace with the candidate inserted, or None if the candidate does not fit.
+        The variant is selected on the trace itself, so that the trace is only copied for candidates
+        that have a variant available. The copy shares most of its bookkeeping with the trace.
+        """
+        candidate = self._select_scenario_variant(candidate_id, tracestate)
+        if not candidate:
+            return None
+        extension = tracestate.copy()
+        modeller.try_to_fit_in_scenario(candidate, extension, self._transpositions)
+        if len(extension) <= len(tracestate) or self.__last_candidate_changed_nothing(extension):
+            return None
+        return extension
+
+    def _in_drought(self, tracestate: TraceState) -> bool:
+        """True when the coverage target is not reached and the trace went too long without new coverage"""
+        return (bool(self.coverage_target) and not tracestate.coverage_reached()
+                and tracestate.coverage_drought > self._drought_limit(tracestate))
+
+    def _drought_limit(self, tracestate: TraceState) -> int:
+        """
+        The number of scenarios a trace can go without new coverage. The fewer scenarios are left
+        uncovered, the longer it takes to come across one of them, so the limit grows with the
+        square root of the ratio of all scenarios to uncovered scenarios. It also scales with the
+        success rate of recent insertion attempts. When most attempts are rejected, the trace is
+        likely stuck in a part of the model that leads nowhere. At a success rate of one half,
+        and with all scenarios uncovered, the limit equals DROUGHT_LIMIT.
+        """
+        uncovered = len(tracestate.not_in_trace)
+        scarcity = (len(tracestate.c_pool) / uncovered) ** 0.5 if uncovered else 1
+        success_rate = (sum(self._recent_attempts) / len(self._recent_attempts)) if self._recent_attempts else 1
+        limit = self.DROUGHT_LIMIT * scarcity * 2 * max(success_rate, 0.1)
+        return int(min(self.MAX_DROUGHT_LIMIT, max(self.MIN_DROUGHT_LIMIT, limit)))
+
+    @staticmethod
+    def _beam_score(tracestate: TraceState) -> tuple:
+        # The random last element breaks ties, in a reproducible way for a given seed
+        return (len(tracestate.covered_ids), -len(tracestate.unreached), -tracestate.coverage_drought,
+                randomiser.generator().random())
+
+    @staticmethod
+    def _last_scenario_id(tracestate: TraceState) -> int | None:
+        return TraceState.split_id(tracestate[-1].id)[0] if len(tracestate) else None
 
     @staticmethod
     def __last_candidate_changed_nothing(tracestate: TraceState) -> bool:
@@ -440,11 +757,17 @@ class ModelBased(SuiteProcessor):
             return False
         if tracestate[-1].id != tracestate[-2].id:
             return False
-        return tracestate[-1].model == tracestate[-2].model
-
-    def _select_scenario_variant(self, candidate_id: int, tracestate: TraceState) -> Scenario:
+        return tracestate[-1].fingerprint == tracestate[-2].fingerprint
+
+    def _select_scenario_variant(self, candidate_id: int, tracestate: TraceState) -> Scenario | None:
+        model = tracestate.model or ModelSpace()
+        missing_terms = self._dependencies.missing_terms(candidate_id, model)
+        if missing_terms:
+            debug(lambda: f"Skipping scenario {candidate_id}, "
+                          f"it requires {', '.join(missing_terms)} to be in the model")
+            return None
         candidate = self._scenario_with_repeat_counter(candidate_id, tracestate)
-        candidate = modeller.generate_scenario_variant(candidate, tracestate.model or ModelSpace())
+        candidate = modeller.generate_scenario_variant(candidate, model, self._collected_constraints)
         return candidate
 
     def _scenario_with_repeat_counter(self, index: int, tracestate: TraceState) -> Scenario:
@@ -452,7 +775,7 @@ class ModelBased(SuiteProcessor):
         Fetches the scenario by index and, if this scenario is already
         used in the trace, adds a repetition counter to its name.
         """
-        candidate = next(s for s in self.scenarios if s.src_id == index)
+        candidate = self._scenarios_by_id[index]
         rep_count = tracestate.count(index)
         if rep_count:
             candidate = candidate.copy()
@@ -471,10 +794,12 @@ class ModelBased(SuiteProcessor):
 
     @staticmethod
     def _report_tracestate_to_user(tracestate: TraceState):
+        if not is_debug_enabled():
+            return
         pending = ', '.join([str(i) + '*' if i in tracestate.unreached else str(i)
                              for i in sorted(tracestate.not_in_trace)])
-        logger.debug(f"Trace: [{', '.join(tracestate.id_trace)}] Pending: [{pending}]"
-                     f"{' Rejected: ' + str(tracestate.tried) if tracestate.tried else ''}")
+        debug(f"Trace: [{', '.join(tracestate.id_trace)}] Pending: [{pending}]"
+              f"{' Rejected: ' + str(tracestate.tried) if tracestate.tried else ''}")
 
     def _report_tracestate_wrapup(self):
         if self.are_all_targets_reached(committed_only=False):
@@ -483,7 +808,7 @@ class ModelBased(SuiteProcessor):
             logger.info("First part of trace composed: (Check scenarios tagged with `mbt trace extension` for continued generation)")
         for progression in self.tracestate:
             logger.info(progression.scenario.name)
-            logger.debug(f"model\n{progression.model.get_status_text()}\n")
+            debug(lambda: f"model\n{progression.model.get_status_text()}\n")
 
     @staticmethod
     def _init_randomiser(seed: str | int | bytes | bytearray | None):
@@ -541,7 +866,7 @@ class ModelBased(SuiteProcessor):
             except TimeoutExceeded:
                 raise
             except Exception as e:
-                logger.debug(f'Could not update visualisation due to error!\n{e}')
+                debug(f'Could not update visualisation due to error!\n{e}')
 
     def _write_visualisation(self, graph_style: str):
         if self._visualiser:
@@ -551,7 +876,7 @@ class ModelBased(SuiteProcessor):
             except TimeoutExceeded:
                 raise
             except Exception as e:
-                logger.debug(f'Could not generate visualisation due to error!\n{e}')
+                debug(f'Could not generate visualisation due to error!\n{e}')
         else:
             logger.info("Graph skipped due to prior failure")
 
@@ -564,4 +889,84 @@ class ModelBased(SuiteProcessor):
                 raise
             except Exception as e:
                 logger.info("Could not export visualisation due to failure.")
-                logger.debug(f"Export error:\n{e}")
+                debug(f"Export error:\n{e}")
+
+
+_discovery_worker: ModelBased | None = None
+_worker_shared_keys: dict[int, tuple] = {}  # id() of shared objects in the worker process -> key
+
+
+def _shared_objects(scenarios: list[Scenario]) -> dict[tuple, object]:
+    """
+    The objects that scenarios in the trace refer to, but that are not specific to a trace, by a key
+    that identifies them in both the main process and the worker processes.
+    """
+    shared = {}
+    for scenario in scenarios:
+        shared[('og_tc', scenario.src_id)] = scenario.og_tc
+        shared[('parent', scenario.src_id)] = scenario.parent
+        shared[('setup', scenario.src_id)] = scenario.setup
+        shared[('teardown', scenario.src_id)] = scenario.teardown
+        for index, step in enumerate(scenario.steps):
+            shared[('step', scenario.src_id, index)] = step
+    return shared
+
+
+class _DiscoveryPickler(pickle.Pickler):
+    """
+    Pickles data for passing between the main process and discovery worker processes. Objects for
+    which reference returns a key are not pickled, but passed by that key (see _loads).
+    """
+
+    def __init__(self, file, reference):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.reference = reference
+
+    def persistent_id(self, obj):
+        return self.reference(obj)
+
+
+class _DiscoveryUnpickler(pickle.Unpickler):
+    def __init__(self, file, resolve):
+        super().__init__(file)
+        self.resolve = resolve
+
+    def persistent_load(self, pid):
+        return self.resolve(pid)
+
+
+def _dumps(obj, reference) -> bytes:
+    data = io.BytesIO()
+    _DiscoveryPickler(data, reference).dump(obj)
+    return data.getvalue()
+
+
+def _loads(data: bytes, resolve):
+    return _DiscoveryUnpickler(io.BytesIO(data), resolve).load()
+
+
+def _init_discovery_worker(settings_data: bytes):
+    """
+    Prepares a worker process for running one-shot traces for direct trace discovery. Robot's test
+    cases are not passed to the worker. In their place, scenarios hold the key of their test case.
+    """
+    global _discovery_worker, _worker_shared_keys
+    settings = _loads(settings_data, lambda key: key)
+    _discovery_worker = ModelBased()
+    _discovery_worker.__dict__.update(settings)
+    _discovery_worker._visualiser = None
+    _discovery_worker._transpositions = modeller.LRUCache(maxsize=4096)
+    _discovery_worker._collected_constraints = modeller.LRUCache(maxsize=4096)
+    _worker_shared_keys = {}
+    for key, obj in _shared_objects(_discovery_worker.scenarios).items():
+        if obj is not None:
+            _worker_shared_keys.setdefault(id(obj), key)
+
+
+def _one_shot_trace_in_worker(prio_order: list[int], seed: int) -> bytes:
+    """
+    Returns the pickled trace. Objects that the main process already has, like its scenarios' steps
+    and test cases, are passed by key, so that the main process can rebind them to its own objects.
+    """
+    tracestate = _discovery_worker._one_shot_trace(prio_order, seed)
+    return _dumps(tracestate, lambda obj: _worker_shared_keys.get(id(obj)))
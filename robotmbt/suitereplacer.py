@@ -39,7 +39,9 @@ import robot.running.model as rmodel
 from robot.api import logger
 from robot.api.deco import library, keyword
 from robot.libraries.BuiltIn import BuiltIn
+from robot.running.keywordimplementation import KeywordImplementation
 
+from .suitecache import SuiteCache
 from .suitedata import Suite, Scenario, Step
 from .suiteprocessors import SuiteProcessor, ModelBased, Echo, Flatten
 
@@ -56,6 +58,9 @@ class SuiteReplacer:
         self.suite_gen: list[Iterator[Suite]] = []  # Generator for on-the-fly suite insertion
         self.test_case_gen: list[Iterator[Scenario]] = []  # Generator for on-the-fly test case insertion
         self.processor_options: dict[str, Any] = {}
+        # Per analysis, steps that occur repeatedly are only resolved and analysed once
+        self._resolved_keywords: dict[str, KeywordImplementation] = {}
+        self._analysed_steps: dict[tuple[str, tuple[str, ...]], Step] = {}
 
     def load_processor(self):
         if self.processor_name.lower() == 'robotmbt':
@@ -86,7 +91,7 @@ class SuiteReplacer:
         logger.info(f"Analysing Robot test suite '{self.current_suite.name}' for model-based execution.")
         local_settings = self.processor_options.copy()
         local_settings.update(kwargs)
-        master_suite = self.__process_robot_suite(self.current_suite, parent=None)
+        master_suite = self.__analyse_suite(self.current_suite, local_settings.pop('suite_cache', None))
         self.load_processor()
         modelbased_suite = self.processor.process_test_suite(master_suite, **local_settings)
         self.suite_gen = [iter(modelbased_suite.suites)]
@@ -123,17 +128,32 @@ class SuiteReplacer:
         """
         ModelBased().draw_graph_from_export_file(json_file_path, graph_style)
 
+    def __analyse_suite(self, in_suite: robot.model.TestSuite, cache_dir: str | None) -> Suite:
+        self._resolved_keywords.clear()
+        self._analysed_steps.clear()
+        if not cache_dir:
+            return self.__process_robot_suite(in_suite, parent=None)
+        cache = SuiteCache(cache_dir)
+        key = cache.key(in_suite, Robot._namespace)
+        master_suite = cache.load(key, in_suite)
+        if master_suite:
+            logger.info(f"Reusing cached analysis of test suite '{in_suite.name}'.")
+        else:
+            master_suite = self.__process_robot_suite(in_suite, parent=None)
+            cache.store(key, master_suite)
+        return master_suite
+
     def __process_robot_suite(self, in_suite: robot.model.TestSuite, parent: Suite | None) -> Suite:
         out_suite = Suite(in_suite.name, parent)
         out_suite.filename = in_suite.source
 
         if in_suite.setup and parent is not None:
             step_info = Step(in_suite.setup.name, *in_suite.setup.args, parent=out_suite)
-            step_info.add_robot_dependent_data(Robot._namespace.get_runner(step_info.org_step).keyword)
+            self.__add_robot_dependent_data(step_info)
             out_suite.setup = step_info
         if in_suite.teardown and parent is not None:
             step_info = Step(in_suite.teardown.name, *in_suite.teardown.args, parent=out_suite)
-            step_info.add_robot_dependent_data(Robot._namespace.get_runner(step_info.org_step).keyword)
+            self.__add_robot_dependent_data(step_info)
             out_suite.teardown = step_info
         for st in in_suite.suites:
             out_suite.suites.append(self.__process_robot_suite(st, parent=out_suite))
@@ -141,18 +161,18 @@ class SuiteReplacer:
             scenario = Scenario(tc.name, parent=out_suite, og_tc=tc)
             if tc.setup:
                 step_info = Step(tc.setup.name, *tc.setup.args, parent=scenario)
-                step_info.add_robot_dependent_data(Robot._namespace.get_runner(step_info.org_step).keyword)
+                self.__add_robot_dependent_data(step_info)
                 scenario.setup = step_info
             if tc.teardown:
                 step_info = Step(tc.teardown.name, *tc.teardown.args, parent=scenario)
-                step_info.add_robot_dependent_data(Robot._namespace.get_runner(step_info.org_step).keyword)
+                self.__add_robot_dependent_data(step_info)
                 scenario.teardown = step_info
             last_gwt = None
             for step_def in tc.body:
                 if isinstance(step_def, rmodel.Keyword):
                     step_info = Step(step_def.name, *step_def.args, parent=scenario, assign=step_def.assign,
                                      prev_gherkin_kw=last_gwt)
-                    step_info.add_robot_dependent_data(Robot._namespace.get_runner(step_info.org_step).keyword)
+                    self.__add_robot_dependent_data(step_info)
                     scenario.steps.append(step_info)
                     if step_info.gherkin_kw:
                         last_gwt = step_info.gherkin_kw
@@ -165,6 +185,20 @@ class SuiteReplacer:
             out_suite.scenarios.append(scenario)
         return out_suite
 
+    def __add_robot_dependent_data(self, step: Step):
+        """
+        The same steps tend to appear in many scenarios. Each distinct keyword is resolved
+        only once and each distinct step, with its arguments, is analysed only once.
+        """
+        key = (step.org_step, step.org_pn_args)
+        if key in self._analysed_steps:
+            step.copy_robot_dependent_data(self._analysed_steps[key])
+            return
+        if step.org_step not in self._resolved_keywords:
+            self._resolved_keywords[step.org_step] = Robot._namespace.get_runner(step.org_step).keyword
+        step.add_robot_dependent_data(self._resolved_keywords[step.org_step])
+        self._analysed_steps[key] = step.copy()
+
     def __clearTestSuite(self, suite: robot.model.TestSuite):
         suite.tests.clear()
         suite.suites.clear()
@@ -30,26 +30,51 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-import random
+from collections.abc import Callable
 
+from robotmbt import randomiser
 from robotmbt.modelspace import ModelSpace
 from robotmbt.suitedata import Scenario
 
 
 class TraceSnapShot:
+    __slots__ = ('id', 'scenario', 'remainder', '_model', 'coverage_reached', 'coverage_drought')
+
     def __init__(self, id: str, inserted_scenario: Scenario, model_state: ModelSpace,
-                 remainder: Scenario | None = None, coverage: int = 0, drought: int = 0):
+                 remainder: Scenario | None = None, coverage: int = 0, drought: int = 0,
+                 previous: 'TraceSnapShot | None' = None):
+        """
+        When the previous snapshot in the trace is passed, the domain terms that the scenario left
+        unchanged are shared with that snapshot. Each snapshot then only holds its own copy of the
+        terms that changed. The model's fingerprint and state key are computed once, when taking the snapshot.
+        """
         self.id: str = id
         self.scenario: Scenario = inserted_scenario
         self.remainder: Scenario | None = remainder
         self._model: ModelSpace = model_state.copy()
+        if isinstance(self._model, ModelSpace):
+            # Computed up front, so that the copies handed out by model all inherit them
+            self._model.fingerprint, self._model.state_key
+            if previous and isinstance(previous._model, ModelSpace):
+                self._model.share_unchanged_terms(previous._model)
         self.coverage_reached: int = coverage
         self.coverage_drought: int = drought
 
     @property
     def model(self) -> ModelSpace:
+        """Returns a copy of the model, which is safe to modify. Content is shared until it is modified."""
         return self._model.copy()
 
+    @property
+    def fingerprint(self) -> str:
+        """Fingerprint of the model state, see ModelSpace.fingerprint"""
+        return self._model.fingerprint
+
+    @property
+    def state_key(self) -> str:
+        """Exact model state, see ModelSpace.state_key"""
+        return self._model.state_key
+
 
 class TraceState:
     def __init__(self, scenario_indexes: list[int]):
@@ -58,8 +83,15 @@ class TraceState:
             raise ValueError("Scenarios must be uniquely identifiable")
         self.unreached = sorted(scenario_indexes)
         self._tried: list[list[int]] = [[]]  # Keeps track of the scenarios already tried at each step in the trace
+        self._tried_sets: list[set[int]] = [set()]  # Same content as _tried, for quick lookup
         self._snapshots: list[TraceSnapShot] = []  # Keeps details for elements in trace
+        # Index of the trace per scenario: the positions in _snapshots that hold (parts of) that scenario.
+        # Scenarios are kept in order of their first appearance in the trace.
+        self._positions: dict[int, list[int]] = {}
         self._open_refinements: list[int] = []
+        # Trace lengths at which coverage last increased, without any refinement open at that point.
+        # These are the points that a drought recovery can rewind to in one go.
+        self._recovery_points: list[int] = []
         # The rewind limit indicates a (soft) limit for scenarios that should not be rewound. E.g. because they were
         # already scheduled for execution. It refers to the number of scenarios that should remain in the trace.
         self.rewind_limit = 0
@@ -98,14 +130,7 @@ class TraceState:
         List of scenario source ids, in order of selection for insertion, that are part of the trace.
         E.g. [2, 1, 3] for ['2.1', '1', '2.0', '1', '3']
         """
-        src_ids = [src_id for src_id in self.c_pool if self.count(src_id) > 0]
-        sorted_ids = []
-        while len(sorted_ids) < len(src_ids):
-            for snap in self._snapshots:
-                id = int(snap.id.split('.')[0])
-                if id in src_ids:
-                    sorted_ids.append(src_ids.pop(src_ids.index(id)))
-        return sorted_ids
+        return [src_id for src_id in self._positions if self.c_pool[src_id] > 0]
 
     @property
     def not_in_trace(self) -> list[int]:
@@ -123,9 +148,14 @@ class TraceState:
         cp = TraceState(self.c_pool.keys())
         cp.c_pool.update(self.c_pool)
         cp.unreached = self.unreached[:]
-        cp._tried = [triedlist[:] for triedlist in self._tried]
+        # Only the last level of tried scenarios is modified, earlier levels are shared with the copy.
+        # Likewise, lists of positions are replaced rather than modified, so the copy can share them.
+        cp._tried = self._tried[:-1] + [self._tried[-1][:]]
+        cp._tried_sets = self._tried_sets[:-1] + [set(self._tried_sets[-1])]
         cp._snapshots = self._snapshots[:]
+        cp._positions = dict(self._positions)
         cp._open_refinements = self._open_refinements[:]
+        cp._recovery_points = self._recovery_points[:]
         cp.rewind_limit = self.rewind_limit
         return cp
 
@@ -135,17 +165,41 @@ class TraceState:
     def get_trace(self) -> list[Scenario]:
         return [snap.scenario for snap in self._snapshots]
 
-    def next_candidate(self, retry: bool = False, randomise: bool = False):
-        untried_candidates = [i for i in self.c_pool if i not in self._tried[-1]
-                              and not self.is_refinement_active(i)]
-        uncovered_candidates = [i for i in untried_candidates if self.count(i) == 0]
-
+    def next_candidate(self, retry: bool = False, randomise: bool = False,
+                       weigh: Callable[[int], float] | None = None):
+        """
+        When randomising, weigh can be passed to draw candidates with a probability proportional to
+        their weight, instead of uniformly. Candidates that are not covered yet still take precedence.
+        """
+        uncovered_candidates, covered_candidates = self._untried_candidates()
         if uncovered_candidates:
-            return random.choice(uncovered_candidates) if randomise else uncovered_candidates[0]
-        elif not retry or not untried_candidates:
+            return self._pick(uncovered_candidates, randomise, weigh)
+        elif not retry or not covered_candidates:
             return None
         else:
-            return random.choice(untried_candidates) if randomise else untried_candidates[0]
+            return self._pick(covered_candidates, randomise, weigh)
+
+    @staticmethod
+    def _pick(candidates: list[int], randomise: bool, weigh: Callable[[int], float] | None) -> int:
+        if not randomise:
+            return candidates[0]
+        if weigh is None:
+            return randomiser.generator().choice(candidates)
+        return randomiser.generator().choices(candidates, weights=[weigh(c) for c in candidates])[0]
+
+    def next_candidates(self, retry: bool = False) -> list[int]:
+        """
+        Returns all scenarios that qualify as next candidate, with the scenarios that are not
+        covered yet first. Covered scenarios are only included when retrying.
+        """
+        uncovered_candidates, covered_candidates = self._untried_candidates()
+        return uncovered_candidates + covered_candidates if retry else uncovered_candidates
+
+    def _untried_candidates(self) -> tuple[list[int], list[int]]:
+        tried = self._tried_sets[-1]
+        untried_candidates = [i for i in self.c_pool if i not in tried and not self.is_refinement_active(i)]
+        return ([i for i in untried_candidates if self.count(i) == 0],
+                [i for i in untried_candidates if self.count(i) > 0])
 
     def count(self, index: int) -> int:
         """
@@ -159,12 +213,10 @@ class TraceState:
         Given the current trace and an index, returns the highest part number of an ongoing
         refinement for the related scenario. Returns 0 when there is no refinement active.
         """
-        for i in range(1, len(self.id_trace) + 1):
-            if self.id_trace[-i] == f'{index}':
-                return 0
-            if self.id_trace[-i].startswith(f'{index}.'):
-                return int(self.id_trace[-i].split('.')[1])
-        return 0
+        if index not in self._positions:
+            return 0
+        _, part = self.split_id(self._snapshots[self._positions[index][-1]].id)
+        return part or 0
 
     def is_refinement_active(self, index: int | None = None) -> bool:
         """
@@ -182,12 +234,44 @@ class TraceState:
         This method retrieves the remainder for the last part that was pushed.
         """
         last_part = self.highest_part(index)
-        index = -self.id_trace[::-1].index(f'{index}.{last_part}') - 1
-        return self._snapshots[index].remainder
+        last_id = f'{index}.{last_part}'
+        for position in reversed(self._positions.get(index, [])):
+            if self._snapshots[position].id == last_id:
+                return self._snapshots[position].remainder
+        raise ValueError(f"No part {last_id} in trace")
 
     def reject_scenario(self, i_scenario: int):
         """Trying a scenario excludes it from further cadidacy on this level"""
-        self._tried[-1].append(i_scenario)
+        self._mark_tried(i_scenario)
+
+    def _mark_tried(self, index: int):
+        self._tried[-1].append(index)
+        self._tried_sets[-1].add(index)
+
+    def _next_level(self):
+        self._tried.append([])
+        self._tried_sets.append(set())
+
+    def _drop_levels(self, n: int):
+        del self._tried[len(self._tried)-n:]
+        del self._tried_sets[len(self._tried_sets)-n:]
+        # The level that is last now may be shared with copies of this trace (see copy)
+        self._tried[-1] = self._tried[-1][:]
+        self._tried_sets[-1] = set(self._tried_sets[-1])
+
+    def _push_snapshot(self, index: int, snapshot: TraceSnapShot):
+        self._positions[index] = self._positions.get(index, []) + [len(self._snapshots)]
+        self._snapshots.append(snapshot)
+
+    def _pop_snapshot(self) -> TraceSnapShot:
+        snapshot = self._snapshots.pop()
+        index, _ = self.split_id(snapshot.id)
+        self._positions[index] = self._positions[index][:-1]
+        if not self._positions[index]:
+            del self._positions[index]
+        while self._recovery_points and self._recovery_points[-1] > len(self._snapshots):
+            self._recovery_points.pop()
+        return snapshot
 
     def confirm_full_scenario(self, index: int, scenario: Scenario, model: ModelSpace):
         c_drought = 0 if self.c_pool[index] == 0 else self.coverage_drought + 1
@@ -199,21 +283,25 @@ class TraceState:
             self._open_refinements.pop()
         else:
             id = str(index)
-            self._tried[-1].append(index)
-            self._tried.append([])
-        self._snapshots.append(TraceSnapShot(id, scenario, model,
-                                             coverage=min(self.c_pool.values()), drought=c_drought))
+            self._mark_tried(index)
+            self._next_level()
+        self._push_snapshot(index, TraceSnapShot(id, scenario, model,
+                                                 coverage=min(self.c_pool.values()), drought=c_drought,
+                                                 previous=self._snapshots[-1] if self._snapshots else None))
+        if c_drought == 0 and not self._open_refinements:
+            self._recovery_points.append(len(self._snapshots))
 
     def push_partial_scenario(self, index: int, scenario: Scenario, model: ModelSpace, remainder=None):
         if self.is_refinement_active(index):
             id = f"{index}.{self.highest_part(index) + 1}"
         else:
             id = f"{index}.1"
-            self._tried[-1].append(index)
+            self._mark_tried(index)
             self._open_refinements.append(index)
-        self._tried.append([])
-        self._snapshots.append(TraceSnapShot(id, scenario, model, remainder,
-                                             coverage=min(self.c_pool.values()), drought=self.coverage_drought))
+        self._next_level()
+        self._push_snapshot(index, TraceSnapShot(id, scenario, model, remainder,
+                                                 coverage=min(self.c_pool.values()), drought=self.coverage_drought,
+                                                 previous=self._snapshots[-1] if self._snapshots else None))
 
     def can_rewind(self) -> bool:
         rewind_margin = len(self._snapshots[self.rewind_limit:])
@@ -229,9 +317,10 @@ class TraceState:
 
         # Refined scenarios that are already closed will be rewound in full.
         # Check if the scenario's opening part is within the rewind margin.
-        for i in range(1, rewind_margin + 1):
-            if self._snapshots[-i].id == f'{index}.1':
-                n = i
+        for position in reversed(self._positions[index]):
+            if position < self.rewind_limit:
+                break
+            if self._snapshots[position].id == f'{index}.1':
                 return True
         return False  # went beyond rewind limit
 
@@ -246,7 +335,7 @@ class TraceState:
         """
         id = self._snapshots[-1].id
         index, part = self.split_id(id)
-        self._snapshots.pop()
+        self._pop_snapshot()
         if id.endswith('.0'):
             # refined scenarios are rewinded in full
             self.c_pool[index] -= 1
@@ -255,7 +344,7 @@ class TraceState:
                 self.rewind()
             return self.rewind()
 
-        self._tried.pop()
+        self._drop_levels(1)
         if part and part > 1:
             # When rewinding an 'in between' part, rewind both the part and the refinement
             return self.rewind()
@@ -266,6 +355,34 @@ class TraceState:
             self._open_refinements.pop()
         return self._snapshots[-1] if self._snapshots else None
 
+    def rewind_to_recovery_point(self) -> TraceSnapShot | None:
+        """
+        Rewinds the trace in one go to the last full scenario that increased coverage, without any
+        refinement open at that point. At least one scenario is rewound. Returns the snapshot at
+        the end of the rewound trace, or None if there is no such point within the rewind limit.
+        In that case the trace is left unchanged.
+
+        This can rewind further than repeated rewind() calls until the drought ends. Those stop at
+        the first scenario that increased coverage, even when a refinement is still open there.
+        A recovery point is never inside an open refinement, so the trace is then rewound to before
+        the refined scenario, or further back to the recovery point before it.
+        """
+        points = [p for p in self._recovery_points[-2:] if p < len(self._snapshots)]
+        if not points or points[-1] < self.rewind_limit:
+            return None
+        target = points[-1]
+        levels = 0
+        for snapshot in reversed(self._snapshots[target:]):
+            index, part = self.split_id(snapshot.id)
+            self._pop_snapshot()
+            if part is None or part == 0:
+                self.c_pool[index] -= 1
+            if part != 0:
+                levels += 1
+        self._drop_levels(levels)
+        self._open_refinements = []  # No refinements are open at a recovery point
+        return self._snapshots[-1] if self._snapshots else None
+
     @staticmethod
     def split_id(id: str) -> tuple[int, int | int, None]:
         return tuple(map(int, id.split('.'))) if '.' in id else (int(id), None)
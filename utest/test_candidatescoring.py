@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# BSD 3-Clause License
+#
+# Copyright (c) 2026, J. Foederer
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+from robotmbt.candidatescoring import CandidateScorer, HistoryScorer, SCORERS
+
+
+class TestCandidateScorer(unittest.TestCase):
+    def test_all_candidates_score_the_same(self):
+        scorer = CandidateScorer()
+        scorer.record(1, 2, accepted=False)
+        self.assertEqual(scorer.score(1, 2), scorer.score(None, 3))
+
+    def test_history_scorer_is_registered(self):
+        self.assertIs(SCORERS['history'], HistoryScorer)
+
+
+class TestHistoryScorer(unittest.TestCase):
+    def setUp(self):
+        self.scorer = HistoryScorer()
+
+    def test_candidates_without_history_score_equal_and_positive(self):
+        self.assertGreater(self.scorer.score(None, 1), 0)
+        self.assertEqual(self.scorer.score(None, 1), self.scorer.score(2, 3))
+
+    def test_rejections_lower_the_score(self):
+        before = self.scorer.score(1, 2)
+        self.scorer.record(1, 2, accepted=False)
+        self.assertLess(self.scorer.score(1, 2), before)
+        self.assertGreater(self.scorer.score(1, 2), 0)
+
+    def test_acceptance_raises_the_score(self):
+        before = self.scorer.score(1, 2)
+        self.scorer.record(1, 2, accepted=True)
+        self.assertGreater(self.scorer.score(1, 2), before)
+
+    def test_history_is_kept_per_predecessor(self):
+        for _ in range(5):
+            self.scorer.record(1, 2, accepted=False)
+        self.scorer.record(3, 2, accepted=True)
+        self.assertLess(self.scorer.score(1, 2), self.scorer.score(None, 2))
+        self.assertGreater(self.scorer.score(3, 2), self.scorer.score(None, 2))
+
+    def test_enabling_new_coverage_raises_the_score_of_the_predecessor(self):
+        self.scorer.record(1, 2, accepted=True, new_coverage=True)
+        self.scorer.record(1, 3, accepted=True, new_coverage=True)
+        self.assertEqual(self.scorer.score(None, 1), 3 * self.scorer.score(None, 4))
+
+    def test_new_coverage_at_the_start_of_the_trace_credits_no_scenario(self):
+        self.scorer.record(None, 2, accepted=True, new_coverage=True)
+        self.assertEqual(self.scorer.score(None, 1), self.scorer.score(None, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+# BSD 3-Clause License
+#
+# Copyright (c) 2026, J. Foederer
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+from robotmbt.dependencygraph import DependencyGraph, ScenarioDependencies
+from robotmbt.modelspace import ModelSpace
+
+
+class TestScenarioDependencies(unittest.TestCase):
+    def test_attribute_access_requires_term(self):
+        scenario = ScenarioStub(1, StepStub('given', IN=['foo.bar == 1'], OUT=[]))
+        self.assertEqual(ScenarioDependencies(scenario).requires, {'foo'})
+
+    def test_created_terms_are_not_required(self):
+        scenario = ScenarioStub(1, StepStub('given', IN=['new foo', 'foo.bar = 1', 'foo.bar == 1'], OUT=[]))
+        deps = ScenarioDependencies(scenario)
+        self.assertEqual(deps.requires, set())
+        self.assertEqual(deps.creates, {'foo'})
+        self.assertEqual(deps.writes, {'foo'})
+        self.assertEqual(deps.reads, {'foo'})
+
+    def test_deleting_term_requires_term(self):
+        scenario = ScenarioStub(1, StepStub('given', IN=['del foo'], OUT=[]))
+        self.assertEqual(ScenarioDependencies(scenario).requires, {'foo'})
+
+    def test_conditional_access_is_not_required(self):
+        scenario = ScenarioStub(1, StepStub('given', IN=['a.x or b.x', 'c.x if d.x else e.x',
+                                                         '[f for f in g.x if h.x]', 'lambda: i.x'], OUT=[]))
+        self.assertEqual(ScenarioDependencies(scenario).requires, {'a', 'd'})
+
+    def test_locally_bound_names_are_not_terms(self):
+        scenario = ScenarioStub(1, StepStub('given', IN=['x = foo; x.bar == 1'], OUT=[]))
+        self.assertEqual(ScenarioDependencies(scenario).requires, set())
+
+    def test_arguments_and_scenario_scope_are_not_terms(self):
+        scenario = ScenarioStub(1, StepStub('given', IN=['${arg}.bar == 1', 'scenario.x == 1', 'foo.upper()'],
+                                            OUT=[]))
+        self.assertEqual(ScenarioDependencies(scenario).requires, set())
+
+    def test_names_containing_arguments_are_not_terms(self):
+        scenario = ScenarioStub(1, StepStub('given', IN=['new user_${x}', 'user_${x}.balance = 1'], OUT=[]),
+                                StepStub('then', IN=[], OUT=['user_${x}.balance == 1', 'del user_${x}']))
+        deps = ScenarioDependencies(scenario)
+        self.assertEqual(deps.requires, set())
+        self.assertEqual(deps.creates, set())
+        self.assertEqual(deps.reads, set())
+        self.assertEqual(deps.writes, set())
+
+    def test_creating_term_by_argument_stops_analysis(self):
+        """The created term could be any term, including ones used later on"""
+        scenario = ScenarioStub(1, StepStub('given', IN=['a.x', 'new ${name}', 'b.x'], OUT=[]))
+        self.assertEqual(ScenarioDependencies(scenario).requires, {'a'})
+
+    def test_analysis_stops_at_when_step_outcome(self):
+        """A failing OUT expression in a when-step leads to refinement, not rejection"""
+        scenario = ScenarioStub(1, StepStub('when', IN=['a.x'], OUT=['b.x == 1', 'c.x == 1']),
+                                StepStub('then', IN=[], OUT=['d.x == 1']))
+        self.assertEqual(ScenarioDependencies(scenario).requires, {'a', 'b'})
+
+    def test_then_steps_are_analysed_in_full(self):
+        scenario = ScenarioStub(1, StepStub('then', IN=['a.x'], OUT=['b.x == 1', 'c.x == 1']))
+        self.assertEqual(ScenarioDependencies(scenario).requires, {'b', 'c'})
+
+    def test_unparsable_expression_stops_analysis(self):
+        scenario = ScenarioStub(1, StepStub('given', IN=['a.x', 'b.x ==', 'c.x'], OUT=[]))
+        self.assertEqual(ScenarioDependencies(scenario).requires, {'a'})
+
+    def test_modifiers_are_reads(self):
+        scenario = ScenarioStub(1, StepStub('given', IN=[], OUT=[], MOD=['${person}= party.guests']))
+        deps = ScenarioDependencies(scenario)
+        self.assertEqual(deps.reads, {'party'})
+        self.assertEqual(deps.requires, set())
+
+
+class TestDependencyGraph(unittest.TestCase):
+    def setUp(self):
+        self.graph = DependencyGraph([
+            ScenarioStub(1, StepStub('given', IN=['new foo'], OUT=[])),
+            ScenarioStub(2, StepStub('given', IN=['foo.x == 0', 'new bar'], OUT=[])),
+            ScenarioStub(3, StepStub('given', IN=['bar.x == 0'], OUT=[])),
+            ScenarioStub(4, StepStub('given', IN=['baz.x == 0'], OUT=[]))])
+
+    def test_producers(self):
+        self.assertEqual(self.graph.producers, {'foo': {1}, 'bar': {2}})
+
+    def test_missing_terms(self):
+        model = ModelSpace()
+        self.assertEqual(self.graph.missing_terms(1, None), [])
+        self.assertEqual(self.graph.missing_terms(2, None), ['foo'])
+        self.assertEqual(self.graph.missing_terms(2, model), ['foo'])
+        model.process_expression('new foo')
+        self.assertEqual(self.graph.missing_terms(2, model), [])
+        self.assertEqual(self.graph.missing_terms(3, model), ['bar'])
+
+    def test_depth(self):
+        self.assertEqual([self.graph.depth(i) for i in [1, 2, 3]], [0, 1, 2])
+        self.assertGreater(self.graph.depth(4), self.graph.depth(3))
+
+
+class ScenarioStub:
+    def __init__(self, src_id: int, *steps):
+        self.src_id = src_id
+        self.steps = list(steps)
+
+
+class StepStub:
+    def __init__(self, gherkin_kw: str | None, **model_info):
+        self.gherkin_kw = gherkin_kw
+        self.model_info = model_info
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+# BSD 3-Clause License
+#
+# Copyright (c) 2026, J. Foederer
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from robot.output.loglevel import LogLevel
+
+from robotmbt import lazylogger
+
+
+@patch('robotmbt.lazylogger.logger')
+@patch('robotmbt.lazylogger.EXECUTION_CONTEXTS')
+class TestLazyLogger(unittest.TestCase):
+    def test_message_is_logged_at_debug_level(self, contexts, logger):
+        contexts.current = self.context_stub('DEBUG')
+        lazylogger.debug(lambda: 'built message')
+        lazylogger.debug('plain message')
+        self.assertEqual([c.args[0] for c in logger.debug.call_args_list], ['built message', 'plain message'])
+
+    def test_message_is_logged_at_trace_level(self, contexts, logger):
+        contexts.current = self.context_stub('TRACE')
+        self.assertTrue(lazylogger.is_debug_enabled())
+
+    def test_message_is_not_built_above_debug_level(self, contexts, logger):
+        contexts.current = self.context_stub('INFO')
+        builder = MagicMock(return_value='built message')
+        lazylogger.debug(builder)
+        builder.assert_not_called()
+        logger.debug.assert_not_called()
+
+    def test_message_is_not_built_outside_robot_execution(self, contexts, logger):
+        contexts.current = None
+        builder = MagicMock(return_value='built message')
+        lazylogger.debug(builder)
+        builder.assert_not_called()
+        logger.debug.assert_not_called()
+
+    def test_message_is_not_built_in_other_threads(self, contexts, logger):
+        contexts.current = self.context_stub('DEBUG')
+        builder = MagicMock(return_value='built message')
+        thread = threading.Thread(target=lazylogger.debug, args=(builder,))
+        thread.start()
+        thread.join()
+        builder.assert_not_called()
+        logger.debug.assert_not_called()
+
+    def test_message_is_logged_when_robot_internals_are_unavailable(self, contexts, logger):
+        with patch('robotmbt.lazylogger.LOGGING_THREADS', None):
+            lazylogger.debug(lambda: 'built message')
+        contexts.current = object()  # without output
+        lazylogger.debug(lambda: 'another message')
+        self.assertEqual([c.args[0] for c in logger.debug.call_args_list], ['built message', 'another message'])
+
+    @staticmethod
+    def context_stub(level: str):
+        context = MagicMock()
+        context.output.log_level = LogLevel(level)
+        return context
+
+
+if __name__ == '__main__':
+    unittest.main()
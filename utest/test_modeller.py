@@ -31,10 +31,12 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import unittest
+from unittest.mock import patch
 
-from robotmbt.modeller import process_scenario
-
+from robotmbt.modeller import LRUCache, generate_scenario_variant, process_scenario, try_to_fit_in_scenario
 from robotmbt.modelspace import ModelSpace
+from robotmbt.steparguments import ArgKind, StepArgument, StepArguments
+from robotmbt.tracestate import TraceState
 
 
 class TestModeller(unittest.TestCase):
@@ -66,15 +68,148 @@ class TestModeller(unittest.TestCase):
         self.assertIsNone(part2)
         self.assertIn("[model.x == 2] is False", fail_info['fail_msg'])
 
+    def test_fit_outcome_is_reused_for_revisited_state(self):
+        scenario = ScenarioStub("my scenario", src_id=1)
+        scenario.steps.append(StepStub('initialise x', dict(IN=[], OUT=['new model', 'model.x = 0'])))
+        tracestate = TraceState([1])
+        transpositions = LRUCache(maxsize=10)
+        try_to_fit_in_scenario(scenario, tracestate, transpositions)
+        self.assertEqual(len(tracestate), 1)
+        self.assertEqual(len(transpositions), 1)
+        first_model = tracestate.model
+        tracestate.rewind()
+        with patch('robotmbt.modeller.process_scenario', side_effect=AssertionError("not memoised")):
+            try_to_fit_in_scenario(scenario, tracestate, transpositions)
+        self.assertEqual(len(tracestate), 1)
+        self.assertEqual(tracestate[0].scenario.name, "my scenario")
+        self.assertEqual(tracestate.model, first_model)
+        self.assertEqual(tracestate.model.process_expression('model.x'), 0)
+
+    def test_stored_outcome_shares_model_content_with_the_trace(self):
+        setup = ScenarioStub(src_id=1)
+        setup.steps.append(StepStub('initialise', dict(IN=[], OUT=['new a', 'a.x = 0', 'new b', 'b.x = 0'])))
+        scenario = ScenarioStub(src_id=2)
+        scenario.steps.append(StepStub('update b', dict(IN=[], OUT=['b.x = 1'])))
+        tracestate = TraceState([1, 2])
+        try_to_fit_in_scenario(setup, tracestate)
+        transpositions = LRUCache(maxsize=10)
+        try_to_fit_in_scenario(scenario, tracestate, transpositions)
+        (stored_model, split_index, fail_msg), = transpositions._entries.values()
+        self.assertIs(stored_model.props['a'], tracestate[0].model.props['a'])
+        self.assertIs(stored_model.props['b'], tracestate[1].model.props['b'])
+        self.assertIsNone(split_index)
+
+    def test_rejection_is_reused_for_revisited_state(self):
+        scenario = ScenarioStub(src_id=1)
+        scenario.steps.append(StepStub('x should be 2', dict(IN=['model.x == 2'], OUT=[])))
+        tracestate = TraceState([1])
+        transpositions = LRUCache(maxsize=10)
+        try_to_fit_in_scenario(scenario, tracestate, transpositions)
+        self.assertEqual(tracestate.tried, [1])
+        tracestate = TraceState([1])
+        with patch('robotmbt.modeller.process_scenario', side_effect=AssertionError("not memoised")):
+            try_to_fit_in_scenario(scenario, tracestate, transpositions)
+        self.assertEqual(len(tracestate), 0)
+        self.assertEqual(tracestate.tried, [1])
+
+    def test_different_state_is_not_reused(self):
+        scenario = ScenarioStub(src_id=1)
+        scenario.steps.append(StepStub('initialise x', dict(IN=[], OUT=['new model', 'model.x = 0'])))
+        transpositions = LRUCache(maxsize=10)
+        tracestate = TraceState([1])
+        try_to_fit_in_scenario(scenario, tracestate, transpositions)
+        try_to_fit_in_scenario(scenario, tracestate, transpositions)
+        self.assertEqual(len(transpositions), 2)
+
+    @staticmethod
+    def scenario_with_modifier(modifier: str) -> 'ScenarioStub':
+        scenario = ScenarioStub(src_id=1)
+        step = StepStub('when Johan writes a card', dict(MOD=[modifier]))
+        step.args = StepArguments([StepArgument('person', 'Johan', kind=ArgKind.EMBEDDED)])
+        scenario.steps.append(step)
+        return scenario
+
+    def test_collected_constraints_are_reused_for_the_same_model(self):
+        scenario = self.scenario_with_modifier("${person}= ['Johan', 'Frederique']")
+        model = ModelSpace()
+        cache = LRUCache(maxsize=10)
+        first = generate_scenario_variant(scenario, model, cache)
+        self.assertIn(first.steps[0].args['${person}'].value, ['Johan', 'Frederique'])
+        with patch.object(ModelSpace, 'process_expression', side_effect=AssertionError("not memoised")):
+            for _ in range(10):
+                variant = generate_scenario_variant(scenario, model, cache)
+                self.assertIn(variant.steps[0].args['${person}'].value, ['Johan', 'Frederique'])
+        self.assertEqual(scenario.steps[0].args['${person}'].value, 'Johan')
+        self.assertEqual(len(cache), 1)
+
+    def test_rejection_by_modifier_is_reused_for_the_same_model(self):
+        scenario = self.scenario_with_modifier("${person}= []")
+        model = ModelSpace()
+        cache = LRUCache(maxsize=10)
+        self.assertIsNone(generate_scenario_variant(scenario, model, cache))
+        with patch.object(ModelSpace, 'process_expression', side_effect=AssertionError("not memoised")):
+            self.assertIsNone(generate_scenario_variant(scenario, model, cache))
+
+    def test_constraints_are_collected_again_for_a_different_model(self):
+        scenario = self.scenario_with_modifier("${person}= model.guests")
+        cache = LRUCache(maxsize=10)
+        for guests in (['Bahar'], ['Tannaz']):
+            model = ModelSpace()
+            model.process_expression('new model')
+            model.process_expression(f"model.guests = {guests}")
+            variant = generate_scenario_variant(scenario, model, cache)
+            self.assertEqual(variant.steps[0].args['${person}'].value, guests[0])
+        self.assertEqual(len(cache), 2)
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_least_recently_used_entry_is_dropped(self):
+        cache = LRUCache(maxsize=2)
+        cache['a'] = 1
+        cache['b'] = 2
+        self.assertEqual(cache.get('a'), 1)
+        cache['c'] = 3
+        self.assertEqual(len(cache), 2)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+
+    def test_missing_entry_returns_default(self):
+        cache = LRUCache(maxsize=2)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('a', 'default'), 'default')
+
+    def test_overwriting_keeps_size(self):
+        cache = LRUCache(maxsize=2)
+        cache['a'] = 1
+        cache['a'] = 2
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get('a'), 2)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_copy_has_its_own_entries(self):
+        cache = LRUCache(maxsize=2)
+        cache['a'] = 1
+        duplicate = cache.copy()
+        duplicate['b'] = 2
+        duplicate['c'] = 3
+        self.assertEqual(cache.get('a'), 1)
+        self.assertNotIn('b', cache)
+        self.assertEqual(duplicate.maxsize, 2)
+        self.assertNotIn('a', duplicate)
+
 
 class ScenarioStub:
-    def __init__(self, name: str = 'dummy'):
+    def __init__(self, name: str = 'dummy', src_id: int = 0):
         self.name = name
-        self.src_id = 0
+        self.src_id = src_id
         self.steps = []
 
     def copy(self):
-        return ScenarioStub(self.name)
+        duplicate = ScenarioStub(self.name, self.src_id)
+        duplicate.steps = [step.copy() for step in self.steps]
+        return duplicate
 
 
 class StepStub:
@@ -88,6 +223,11 @@ class StepStub:
     def __str__(self):
         return self.org_step
 
+    def copy(self):
+        duplicate = StepStub(self.org_step, self.model_info)
+        duplicate.args = StepArguments(self.args) if isinstance(self.args, StepArguments) else self.args
+        return duplicate
+
 
 class ArgStub(list):
     def fill_in_args(self, text, as_code=True):
@@ -32,8 +32,11 @@
 
 import sys
 import unittest
+from unittest.mock import patch
 
-from robotmbt.modelspace import ModelSpace, ModellingError
+from robotmbt import modelspace
+from robotmbt.modelspace import (ModelSpace, ModellingError, compile_expression, may_modify_model, rebound_names,
+                                 referenced_names)
 
 
 class TestModelSpace(unittest.TestCase):
@@ -93,6 +96,32 @@ class TestModelSpace(unittest.TestCase):
         self.m.add_prop('foo')
         self.assertEqual(self.m.process_expression('foo.bar = 13'), 'exec')
 
+    def test_compiled_expressions_are_reused(self):
+        mode, code = compile_expression('foo.bar == 13')
+        self.assertEqual(mode, 'eval')
+        self.assertIs(compile_expression('foo.bar == 13')[1], code)
+        mode, code = compile_expression('foo.bar = 13')
+        self.assertEqual(mode, 'exec')
+        self.assertIs(compile_expression('foo.bar = 13')[1], code)
+
+    def test_only_name_bindings_count_as_rebinding(self):
+        self.assertEqual(rebound_names(compile_expression('foo.bar = 13')[1]), set())
+        self.assertEqual(rebound_names(compile_expression('foo.bar == 13')[1]), set())
+        self.assertEqual(rebound_names(compile_expression('[x for x in foo.bar]')[1]), set())
+        self.assertEqual(rebound_names(compile_expression('foo = 13')[1]), {'foo'})
+        self.assertEqual(rebound_names(compile_expression('(bar := 13)')[1]), {'bar'})
+
+    def test_temporary_names_do_not_persist(self):
+        self.m.process_expression('new foo')
+        self.m.process_expression('tmp = 13')
+        self.assertRaises(NameError, self.m.process_expression, 'tmp')
+        self.assertIs(self.m.process_expression('foo'), self.m.foo)
+
+    def test_rebinding_a_domain_term_is_kept(self):
+        self.m.process_expression('new foo')
+        self.m.process_expression('foo = 13')
+        self.assertIs(self.m.process_expression('foo == 13'), True)
+
     def test_new_vocab(self):
         self.m.process_expression('new foo')
         self.assertIn('foo', dir(self.m))
@@ -257,6 +286,141 @@ class TestModelSpace(unittest.TestCase):
         self.assertRaises(NameError, m_copy.process_expression, 'foo2')
         self.assertIs(m_copy.process_expression('foo3.bar == foobar3'), True)
 
+    def test_copies_share_content_until_modified(self):
+        self.m.process_expression('new foo')
+        self.m.process_expression('foo.bar = [1, 2]')
+        m_copy = self.m.copy()
+        self.assertIs(m_copy.process_expression('foo'), self.m.foo)
+        self.assertIs(m_copy.process_expression('foo.bar == [1, 2]'), True)
+        self.assertIs(m_copy.process_expression('foo'), self.m.foo)
+        m_copy.process_expression('foo.bar.append(3)')
+        self.assertIsNot(m_copy.process_expression('foo'), self.m.foo)
+        self.assertIs(self.m.process_expression('foo.bar == [1, 2]'), True)
+        self.assertIs(m_copy.process_expression('foo.bar == [1, 2, 3]'), True)
+
+    def test_read_only_builtins_keep_the_content_shared(self):
+        self.m.process_expression('new foo')
+        self.m.process_expression('foo.bar = [1, 2]')
+        m_copy = self.m.copy()
+        self.assertIs(m_copy.process_expression('len(foo.bar) > 0'), True)
+        self.assertIs(m_copy.process_expression('max(foo.bar) == 2 and isinstance(foo.bar, list)'), True)
+        self.assertIs(m_copy.process_expression('foo'), self.m.foo)
+
+    def test_calls_that_may_modify_the_model(self):
+        for expression in ['foo.bar.append(3)', 'foo.bar.count(1) > 0', 'sorted(foo.bar, key=foo.f)',
+                           'x = foo.bar; x += [3]', 'foo.bar = 3', 'del foo.bar[0]', 'foo.bar[0] = 1',
+                           '[foo.bar.pop() for _ in range(2)]']:
+            self.assertIs(may_modify_model(expression), True, expression)
+        for expression in ['len(foo.bar) > 0', 'sorted(foo.bar) == [1, 2]', 'x = foo.bar',
+                           'all(b > 0 for b in foo.bar)', 'foo.bar[0] == 1']:
+            self.assertIs(may_modify_model(expression), False, expression)
+
+    def test_copies_keep_references_between_terms(self):
+        self.m.process_expression('new foo1')
+        self.m.process_expression('new foo2')
+        self.m.process_expression('foo2.ref = foo1')
+        m_copy = self.m.copy()
+        m_copy.process_expression('foo2.ref.bar = 13')
+        self.assertIs(m_copy.process_expression('foo1.bar == 13'), True)
+        self.assertRaises(ModellingError, self.m.process_expression, 'foo1.bar == 13')
+
+    def test_copied_scenario_scopes_are_independent(self):
+        self.m.new_scenario_scope()
+        self.m.process_expression('scenario.foo = bar')
+        m_copy = self.m.copy()
+        m_copy.new_scenario_scope()
+        m_copy.process_expression('scenario.foo = barbar')
+        self.assertIs(m_copy.process_expression('scenario.foo == barbar'), True)
+        self.assertIs(self.m.process_expression('scenario.foo == bar'), True)
+
+    def test_unchanged_terms_can_be_shared_between_copies(self):
+        self.m.process_expression('new foo1')
+        self.m.process_expression('foo1.bar = 1')
+        self.m.process_expression('new foo2')
+        self.m.process_expression('foo2.bar = 2')
+        m1 = self.m.copy()
+        self.m.process_expression('foo1.bar = 1')
+        self.m.process_expression('foo2.bar = 3')
+        m2 = self.m.copy()
+        m2.share_unchanged_terms(m1)
+        self.assertIs(m2.props['foo1'], m1.props['foo1'])
+        self.assertIsNot(m2.props['foo2'], m1.props['foo2'])
+        self.assertIs(m2.process_expression('foo1.bar == 1'), True)
+        self.assertIs(m2.process_expression('foo2.bar == 3'), True)
+
+    def test_shared_terms_are_unaffected_by_later_modifications(self):
+        self.m.process_expression('new foo1')
+        self.m.process_expression('foo1.bar = 1')
+        m1 = self.m.copy()
+        self.m.process_expression('new foo2')
+        m2 = self.m.copy()
+        m2.share_unchanged_terms(m1)
+        self.m.process_expression('foo1.bar = 2')
+        m3 = m2.copy()
+        m3.process_expression('foo1.bar = 3')
+        self.assertIs(m1.process_expression('foo1.bar == 1'), True)
+        self.assertIs(m2.process_expression('foo1.bar == 1'), True)
+        self.assertIs(self.m.process_expression('foo1.bar == 2'), True)
+        self.assertIs(m3.process_expression('foo1.bar == 3'), True)
+
+    def test_terms_referring_to_other_terms_are_not_shared(self):
+        self.m.process_expression('new foo1')
+        self.m.process_expression('new foo2')
+        self.m.process_expression('foo2.ref = foo1')
+        m1 = self.m.copy()
+        self.m.process_expression('new foo3')
+        self.m.process_expression('foo3.bar = 3')
+        m2 = self.m.copy()
+        m2.share_unchanged_terms(m1)
+        self.assertIsNot(m2.props['foo1'], m1.props['foo1'])
+        self.assertIs(m2.process_expression('foo2.ref is foo1'), True)
+
+    def test_only_the_terms_an_expression_names_are_copied(self):
+        self.m.process_expression('new foo1')
+        self.m.process_expression('foo1.bar = [1]')
+        self.m.process_expression('new foo2')
+        m_copy = self.m.copy()
+        m_copy.process_expression('foo2.bar = [2]')
+        self.assertIs(m_copy.props['foo1'], self.m.props['foo1'])
+        self.assertIsNot(m_copy.props['foo2'], self.m.props['foo2'])
+        self.assertIs(m_copy.process_expression('foo2.bar == [2]'), True)
+        self.assertRaises(ModellingError, self.m.process_expression, 'foo2.bar')
+
+    def test_all_terms_are_copied_when_an_expression_reaches_beyond_the_terms_it_names(self):
+        self.m.process_expression('new foo1')
+        self.m.process_expression('foo1.bar = 1')
+        m_copy = self.m.copy()
+        m_copy.process_expression("globals()['foo1'].bar = 2")
+        self.assertIsNot(m_copy.props['foo1'], self.m.props['foo1'])
+        self.assertIs(self.m.process_expression('foo1.bar == 1'), True)
+
+    def test_names_bound_to_the_same_term_stay_bound_after_copying(self):
+        self.m.process_expression('new foo1')
+        self.m.process_expression('new foo2')
+        self.m.process_expression('foo2 = foo1')
+        m_copy = self.m.copy()
+        m_copy.process_expression('foo2.bar = 3')
+        self.assertIs(m_copy.process_expression('foo1.bar == 3'), True)
+        self.assertRaises(ModellingError, self.m.process_expression, 'foo1.bar')
+
+    def test_only_terms_that_are_not_shared_yet_are_compared_for_sharing(self):
+        for n in range(1, 6):
+            self.m.process_expression(f'new foo{n}')
+            self.m.process_expression(f'foo{n}.bar = {n}')
+        m1 = self.m.copy()
+        self.m.process_expression('foo1.bar = 1')
+        m2 = self.m.copy()
+        with patch('robotmbt.modelspace._term_state', wraps=modelspace._term_state) as term_state:
+            m2.share_unchanged_terms(m1)
+        self.assertEqual(term_state.call_count, 2)
+        self.assertTrue(all(m2.props[f'foo{n}'] is m1.props[f'foo{n}'] for n in range(1, 6)))
+
+    def test_referenced_names(self):
+        self.assertEqual(referenced_names('foo.bar = len(foo2.items)'), {'foo', 'foo2', 'len'})
+        self.assertEqual(referenced_names('[x.y for x in foo.items]'), {'x', 'foo'})
+        for expression in ["globals()['foo'].bar = 1", 'vars(foo)', 'foo.__class__', 'syntax error (']:
+            self.assertIsNone(referenced_names(expression), expression)
+
     def test_equal_operator(self):
         m1 = ModelSpace()
         m2 = ModelSpace()
@@ -269,6 +433,63 @@ class TestModelSpace(unittest.TestCase):
         m2.process_expression('foo1.bar1 = 13')
         self.assertFalse(m1 == m2)
 
+    def test_fingerprint_follows_state(self):
+        m1 = ModelSpace()
+        m2 = ModelSpace()
+        self.assertEqual(m1.fingerprint, m2.fingerprint)
+        for action in ['new foo', 'foo.bar = 13']:
+            m1.process_expression(action)
+            self.assertNotEqual(m1.fingerprint, m2.fingerprint)
+            m2.process_expression(action)
+            self.assertEqual(m1.fingerprint, m2.fingerprint)
+        fingerprint = m1.fingerprint
+        m1.process_expression('foo.bar == 13')
+        self.assertEqual(m1.fingerprint, fingerprint)
+        m1.process_expression('foo.bar = 14')
+        self.assertNotEqual(m1.fingerprint, fingerprint)
+
+    def test_fingerprint_follows_status_text(self):
+        m1 = ModelSpace()
+        m2 = ModelSpace()
+        for m in (m1, m2):
+            m.process_expression('new foo')
+        m1.process_expression('foo.bar = 13')
+        m2.process_expression('foo.bar = "13"')
+        m2.process_expression('foo.bar != foobar')  # introduces a literal alias
+        self.assertEqual(m1.fingerprint, m2.fingerprint)
+        self.assertTrue(m1 == m2)
+
+    def test_state_key_follows_exact_state(self):
+        m1 = ModelSpace()
+        m2 = ModelSpace()
+        for m in (m1, m2):
+            m.process_expression('new foo')
+        m1.process_expression('foo.bar = 13')
+        m2.process_expression('foo.bar = "13"')
+        self.assertNotEqual(m1.state_key, m2.state_key)
+        m2.process_expression('foo.bar = 13')
+        self.assertEqual(m1.state_key, m2.state_key)
+        m2.process_expression('foo.bar == foobar')
+        self.assertNotEqual(m1.state_key, m2.state_key)
+        self.assertEqual(m1.fingerprint, m2.fingerprint)
+
+    def test_fingerprint_of_copy(self):
+        self.m.process_expression('new foo')
+        self.m.process_expression('foo.bar = [1]')
+        m_copy = self.m.copy()
+        self.assertEqual(m_copy.fingerprint, self.m.fingerprint)
+        m_copy.process_expression('foo.bar.append(2)')
+        self.assertNotEqual(m_copy.fingerprint, self.m.fingerprint)
+        self.assertEqual({self.m.fingerprint: 'original'}.get(m_copy.fingerprint), None)
+
+    def test_state_key_distinguishes_scenario_scopes(self):
+        self.m.new_scenario_scope()
+        state_key = self.m.state_key
+        self.m.new_scenario_scope()
+        self.assertNotEqual(self.m.state_key, state_key)
+        self.m.end_scenario_scope()
+        self.assertEqual(self.m.state_key, state_key)
+
 
 class TestScenarioScopeVars(unittest.TestCase):
     def setUp(self):
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+# BSD 3-Clause License
+#
+# Copyright (c) 2026, J. Foederer
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import random
+import threading
+import unittest
+
+from robotmbt import randomiser
+
+
+class TestRandomiser(unittest.TestCase):
+    def test_global_generator_is_used_by_default(self):
+        random.seed(13)
+        expected = random.random()
+        random.seed(13)
+        self.assertEqual(randomiser.generator().random(), expected)
+
+    def test_own_generator_is_used_within_context(self):
+        own = random.Random(13)
+        with randomiser.using(own):
+            self.assertIs(randomiser.generator(), own)
+        self.assertIs(randomiser.generator(), random)
+
+    def test_own_generator_only_applies_to_its_thread(self):
+        seen = []
+        own = random.Random(13)
+        with randomiser.using(own):
+            thread = threading.Thread(target=lambda: seen.append(randomiser.generator()))
+            thread.start()
+            thread.join()
+        self.assertEqual(seen, [random])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -249,6 +249,18 @@ class TestStepArguments(unittest.TestCase):
         # otherwise it is assigned the fixed string value 'magic', ready for comparison
         self.assertTrue(eval(args.fill_in_args(expr, as_code=True), lc))
 
+    def test_filled_in_values_are_not_substituted_again(self):
+        argset = StepArguments([StepArgument('foo1', '${foo2}'),
+                                StepArgument('foo2', 'bar2')])
+        self.assertEqual(argset.fill_in_args("${foo1} ${foo2}"), "${foo2} bar2")
+
+    def test_filling_in_reflects_updated_values(self):
+        argset = StepArguments([StepArgument('foo', 'bar')])
+        self.assertEqual(argset.fill_in_args("${foo}!"), "bar!")
+        argset['${foo}'].value = 'baz'
+        self.assertEqual(argset.fill_in_args("${foo}!"), "baz!")
+        self.assertEqual(StepArguments(argset).fill_in_args("${foo}!"), "baz!")
+
     def test_robot_arguments_can_be_non_string(self):
         args = StepArguments([StepArgument('foo1', 1),
                               StepArgument('foo2', None)])
@@ -282,6 +294,26 @@ class TestStepArguments(unittest.TestCase):
         self.assertEqual(argset['${FoO1}'].value, 'bar1')
         self.assertEqual(argset['${foo2}'].value, 'bar2')
 
+    def test_arguments_can_still_be_indexed_by_position(self):
+        argset = StepArguments([StepArgument('foo1', 'bar1'), StepArgument('foo2', 'bar2')])
+        self.assertEqual(argset[1].value, 'bar2')
+        self.assertEqual([arg.value for arg in argset[:1]], ['bar1'])
+
+    def test_unknown_argument_name_raises_key_error(self):
+        argset = StepArguments([StepArgument('foo', 'bar')])
+        self.assertRaises(KeyError, argset.__getitem__, '${bar}')
+
+    def test_name_index_follows_changes_to_the_set(self):
+        argset = StepArguments([StepArgument('foo1', 'bar1')])
+        self.assertEqual(argset['${foo1}'].value, 'bar1')
+        argset += [StepArgument('foo2', 'bar2')]
+        self.assertEqual(argset['${foo2}'].value, 'bar2')
+        argset[0] = StepArgument('foo3', 'bar3')
+        self.assertEqual(argset['${foo3}'].value, 'bar3')
+        self.assertRaises(KeyError, argset.__getitem__, '${foo1}')
+        argset.pop()
+        self.assertRaises(KeyError, argset.__getitem__, '${foo2}')
+
     def test_set_is_modified_if_any_arg_is_modified(self):
         arg1 = StepArgument('foo1', 'bar1')
         arg2 = StepArgument('foo2', 'bar2')
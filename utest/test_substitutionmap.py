@@ -30,8 +30,9 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import random
 import unittest
-from robotmbt.substitutionmap import Constraint, SubstitutionMap
+from robotmbt.substitutionmap import Constraint, Excluding, OptionUniverse, SubstitutionMap
 
 
 class TestSubstitutionMap(unittest.TestCase):
@@ -212,6 +213,49 @@ class TestSubstitutionMap(unittest.TestCase):
             else:
                 assert False, "Invalid solution generated"
 
+    def test_conflict_far_from_its_cause_is_resolved(self):
+        """
+        The only conflict is between A and the pair Y, Z. Many unrelated
+        example values are chosen in between, which must not be retried
+        when resolving it.
+        """
+        sm = SubstitutionMap()
+        sm.substitute('A', [1, 2])
+        for i in range(30):
+            sm.substitute(f"filler{i}", [100+i, 200+i, 300+i])
+        sm.substitute('Y', [1, 3])
+        sm.substitute('Z', [1, 3])
+        for _ in range(20):
+            sm.solve()
+            self.assertEqual(sm.solution['A'], 2)
+            self.assertEqual({sm.solution['Y'], sm.solution['Z']}, {1, 3})
+
+    def test_large_overlapping_option_sets_are_solved(self):
+        sm = SubstitutionMap()
+        for i in range(50):
+            sm.substitute(f"e{i}", list(range(i, i+3)))
+        sm.substitute('last', [50, 51, 52])
+        sm.solve()
+        self.assertEqual(len(set(sm.solution.values())), 51)
+        for i in range(50):
+            self.assertIn(sm.solution[f"e{i}"], range(i, i+3))
+
+    def test_large_set_without_solution_is_rejected(self):
+        sm = SubstitutionMap()
+        for i in range(40):
+            sm.substitute(f"e{i}", list(range(39)))
+        self.assertRaises(ValueError, sm.solve)
+
+    def test_solution_is_reproducible_from_seed(self):
+        sm = SubstitutionMap()
+        for i in range(20):
+            sm.substitute(f"e{i}", list(range(25)))
+        random.seed(1234)
+        first = sm.solve()
+        random.seed(1234)
+        second = sm.solve()
+        self.assertEqual(first, second)
+
     def test_substitution_map_copies_are_independent(self):
         sm = SubstitutionMap()
         sm.substitute('A', [1, 2, 3])
@@ -382,6 +426,137 @@ class TestConstraint(unittest.TestCase):
         cc = c.copy()
         self.assertEqual(c.optionset, cc.optionset)
 
+    def test_options_can_be_checked_for_membership(self):
+        c = Constraint(['one', 'two', 'three'])
+        c.remove_option('two')
+        self.assertIn('one', c)
+        self.assertNotIn('two', c)
+        self.assertNotIn('four', c)
+        self.assertEqual(len(c), 2)
+
+    def test_constraints_sharing_a_universe_keep_their_own_options(self):
+        universe = OptionUniverse()
+        c1 = Constraint(['one', 'two'], universe)
+        c2 = Constraint(['three', 'two'], universe)
+        self.assertEqual(c1.optionset, ['one', 'two'])
+        self.assertCountEqual(c2.optionset, ['two', 'three'])
+        c2.add_constraint(['one', 'three'])
+        self.assertEqual(c1.optionset, ['one', 'two'])
+        self.assertEqual(c2.optionset, ['three'])
+
+    def test_large_option_sets_can_be_constrained(self):
+        c = Constraint(range(10000))
+        c.add_constraint(range(5000, 20000))
+        c.add_constraint([4999, 5000, 9999, 10000])
+        self.assertEqual(c.optionset, [5000, 9999])
+
+
+class TestRangeConstraint(unittest.TestCase):
+    def test_ranges_are_not_expanded(self):
+        c = Constraint(range(10**12))
+        self.assertEqual(len(c), 10**12)
+        self.assertIn(10**11, c)
+        self.assertEqual(c.universe.values, [])
+
+    def test_empty_range_is_rejected(self):
+        self.assertRaises(ValueError, Constraint, range(5, 5))
+
+    def test_ranges_intersect_as_ranges(self):
+        c = Constraint(range(0, 10**9, 4))
+        c.add_constraint(range(10**9, 2, -6))
+        self.assertEqual(c.range, range(4, 10**9, 12))
+
+    def test_disjoint_ranges_leave_no_options(self):
+        c = Constraint(range(0, 100, 2))
+        self.assertRaises(ValueError, c.add_constraint, range(1, 100, 2))
+
+    def test_range_narrowed_by_list_keeps_listed_options_in_range(self):
+        c = Constraint(range(1, 10))
+        c.add_constraint([0, 3, 'three', 9, 10, 3])
+        self.assertEqual(c.optionset, [3, 9])
+        self.assertIsNone(c.range)
+
+    def test_list_narrowed_by_range(self):
+        c = Constraint([0, 3, 'three', 9, 10])
+        c.add_constraint(range(1, 10))
+        self.assertEqual(c.optionset, [3, 9])
+
+    def test_options_can_be_removed_from_ranges_and_undone(self):
+        c = Constraint(range(3))
+        c.remove_option(1)
+        c.remove_option(7)
+        self.assertEqual(c.optionset, [0, 2])
+        c.undo_remove()
+        c.undo_remove()
+        self.assertEqual(c.optionset, [0, 1, 2])
+
+    def test_excluding_removes_options(self):
+        c = Constraint(range(5))
+        c.add_constraint(Excluding([0, 4, 9]))
+        self.assertEqual(c.optionset, [1, 2, 3])
+        c = Constraint(['one', 'two', 'three'])
+        c.add_constraint(Excluding(['two']))
+        self.assertEqual(c.optionset, ['one', 'three'])
+        self.assertRaises(ValueError, c.add_constraint, Excluding(['one', 'three']))
+
+    def test_excluding_cannot_be_an_initial_constraint(self):
+        self.assertRaises(ValueError, Constraint, Excluding([1]))
+
+    def test_picks_stay_within_the_remaining_options(self):
+        c = Constraint(range(10))
+        c.add_constraint(Excluding(range(8)))
+        self.assertIn(c.pick(set()), [8, 9])
+        self.assertEqual(c.pick({8}), 9)
+        self.assertIsNone(c.pick({8, 9}))
+
+    def test_large_ranges_are_solved(self):
+        sm = SubstitutionMap()
+        for i in range(20):
+            sm.substitute(f"e{i}", range(1, 10**9))
+        sm.substitute('e0', range(0, 40, 10))
+        sm.substitute('e1', [10, 20])
+        sm.substitute('e2', [20])
+        sm.solve()
+        self.assertEqual(sm.solution['e0'], 30)
+        self.assertEqual(sm.solution['e1'], 10)
+        self.assertEqual(len(set(sm.solution.values())), 20)
+
+    def test_range_too_small_for_its_example_values_has_no_solution(self):
+        sm = SubstitutionMap()
+        for i in range(5):
+            sm.substitute(f"e{i}", range(4))
+        self.assertRaises(ValueError, sm.solve)
+
+
+class TestOptionUniverse(unittest.TestCase):
+    def test_values_are_interned_in_order_of_first_appearance(self):
+        universe = OptionUniverse()
+        universe.mask_of(['b', 'a'], add=True)
+        universe.mask_of(['c', 'a', 'd'], add=True)
+        self.assertEqual(universe.values, ['b', 'a', 'c', 'd'])
+
+    def test_unknown_values_are_left_out_unless_added(self):
+        universe = OptionUniverse()
+        mask = universe.mask_of(['a', 'b'], add=True)
+        self.assertEqual(universe.mask_of(['b', 'x']), 0b10)
+        self.assertEqual(universe.options_in(mask), ['a', 'b'])
+        self.assertEqual(universe.values, ['a', 'b'])
+
+    def test_unhashable_values_are_never_in_the_universe(self):
+        universe = OptionUniverse()
+        universe.mask_of(['a'], add=True)
+        self.assertEqual(universe.mask_of([['a'], 'a']), 1)
+        self.assertRaises(TypeError, universe.mask_of, [['a']], add=True)
+
+    def test_copied_maps_share_the_universe(self):
+        sm = SubstitutionMap()
+        sm.substitute('A', [1, 2, 3])
+        copy = sm.copy()
+        copy.substitute('B', [4])
+        self.assertIs(sm.universe, copy.universe)
+        self.assertEqual(sm.substitutions['A'].optionset, [1, 2, 3])
+        self.assertNotIn('B', sm.substitutions)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+# BSD 3-Clause License
+#
+# Copyright (c) 2026, J. Foederer
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import robot.running.model as rmodel
+
+from robotmbt.suitecache import SuiteCache
+from robotmbt.suitedata import Suite, Scenario, Step
+
+
+class TestSuiteCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cache = SuiteCache(os.path.join(self.tempdir.name, 'cache'))
+        self.in_suite = rmodel.TestSuite(name='top')
+        sub = self.in_suite.suites.create(name='sub')
+        sub.tests.create(name='sub test').body.create_keyword(name='Given sub step')
+        self.in_suite.tests.create(name='top test').body.create_keyword(name='Given top step')
+        keyword = SimpleNamespace(name='Keyword', args='arg', doc='*model info*', tags=[])
+        self.namespace = SimpleNamespace(libraries=[SimpleNamespace(name='lib', version='1.0', keywords=[keyword])],
+                                         _kw_store=SimpleNamespace(resources={}))
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def analysed_suite(self) -> Suite:
+        top = Suite('top')
+        sub = Suite('sub', parent=top)
+        top.suites.append(sub)
+        for suite, in_suite in ((sub, self.in_suite.suites[0]), (top, self.in_suite)):
+            tc = in_suite.tests[0]
+            scenario = Scenario(tc.name, parent=suite, og_tc=tc)
+            step = Step(tc.body[0].name, parent=scenario)
+            step.model_info = dict(IN=['new thing'], OUT=['thing'])
+            scenario.steps.append(step)
+            suite.scenarios.append(scenario)
+        return top
+
+    def test_stored_suite_can_be_loaded(self):
+        key = self.cache.key(self.in_suite, self.namespace)
+        self.cache.store(key, self.analysed_suite())
+        loaded = self.cache.load(key, self.in_suite)
+        self.assertEqual(loaded.name, 'top')
+        self.assertEqual(loaded.suites[0].parent, loaded)
+        self.assertEqual(loaded.suites[0].scenarios[0].name, 'sub test')
+        step = loaded.scenarios[0].steps[0]
+        self.assertEqual(step.keyword, 'Given top step')
+        self.assertEqual(step.model_info, dict(IN=['new thing'], OUT=['thing']))
+        self.assertIs(step.parent, loaded.scenarios[0])
+
+    def test_loaded_scenarios_refer_to_the_live_test_cases(self):
+        key = self.cache.key(self.in_suite, self.namespace)
+        self.cache.store(key, self.analysed_suite())
+        self.in_suite.tests[0].tags.add('live')
+        loaded = self.cache.load(key, self.in_suite)
+        self.assertEqual(loaded.scenarios[0].og_tc.name, 'top test')
+        self.assertIn('live', loaded.scenarios[0].og_tc.tags)
+        self.assertEqual(loaded.suites[0].scenarios[0].og_tc.name, 'sub test')
+
+    def test_key_is_stable_for_the_same_input(self):
+        self.assertEqual(self.cache.key(self.in_suite, self.namespace), self.cache.key(self.in_suite, self.namespace))
+
+    def test_key_changes_with_suite_content(self):
+        key = self.cache.key(self.in_suite, self.namespace)
+        self.in_suite.tests[0].body.create_keyword(name='Then another step')
+        self.assertNotEqual(self.cache.key(self.in_suite, self.namespace), key)
+
+    def test_key_changes_with_library_version(self):
+        key = self.cache.key(self.in_suite, self.namespace)
+        self.namespace.libraries[0].version = '1.1'
+        self.assertNotEqual(self.cache.key(self.in_suite, self.namespace), key)
+
+    def test_key_changes_with_library_keywords(self):
+        key = self.cache.key(self.in_suite, self.namespace)
+        self.namespace.libraries[0].keywords[0].doc = '*model info*\n:IN: None'
+        doc_key = self.cache.key(self.in_suite, self.namespace)
+        self.assertNotEqual(doc_key, key)
+        self.namespace.libraries[0].keywords[0].args = 'arg, other'
+        self.assertNotEqual(self.cache.key(self.in_suite, self.namespace), doc_key)
+
+    def test_key_changes_with_resource_content(self):
+        resource = os.path.join(self.tempdir.name, 'keywords.resource')
+        with open(resource, 'w') as f:
+            f.write('*** Keywords ***\n')
+        self.namespace._kw_store.resources = {resource: SimpleNamespace(source=resource)}
+        key = self.cache.key(self.in_suite, self.namespace)
+        with open(resource, 'a') as f:
+            f.write('New keyword\n    No operation\n')
+        self.assertNotEqual(self.cache.key(self.in_suite, self.namespace), key)
+
+    def test_missing_entry_loads_as_none(self):
+        self.assertIsNone(self.cache.load('unknown', self.in_suite))
+
+    def test_corrupt_entry_loads_as_none(self):
+        os.makedirs(self.cache.directory)
+        with open(self.cache.directory / 'corrupt.pickle', 'wb') as f:
+            f.write(b'not a pickle')
+        self.assertIsNone(self.cache.load('corrupt', self.in_suite))
+
+    def test_unpicklable_suite_is_not_stored(self):
+        suite = self.analysed_suite()
+        suite.scenarios[0].steps[0].model_info['custom'] = lambda: None
+        self.cache.store('key', suite)
+        self.assertEqual(os.listdir(self.cache.directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
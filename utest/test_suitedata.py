@@ -282,10 +282,16 @@ class TestScenarios(unittest.TestCase):
         self.assertEqual(dup.setup, self.scenario.setup)
         self.assertEqual(dup.teardown, self.scenario.teardown)
         self.assertNotEqual(dup.name, self.scenario.name)
-        self.assertIsNot(dup.steps[0], self.scenario.steps[0])
         self.assertEqual(dup.steps[0].keyword, self.scenario.steps[0].keyword)
         self.assertNotEqual(dup.steps[-1].keyword, self.scenario.steps[-1].keyword)
 
+    def test_copies_share_their_steps_until_replaced(self):
+        dup = self.scenario.copy()
+        self.assertIs(dup.steps[0], self.scenario.steps[0])
+        dup.steps[0] = dup.steps[0].copy()
+        dup.steps[0].model_info['IN'] = ['changed']
+        self.assertNotIn('IN', self.scenario.steps[0].model_info)
+
     def test_exteranally_determined_attributes_are_copied_along(self):
         self.scenario.src_id = 7
 
@@ -476,6 +482,44 @@ class TestSteps(unittest.TestCase):
         step.add_robot_dependent_data(kw)
         self.assertIn('error', step.model_info)
 
+    def test_steps_sharing_a_keyword_have_independent_model_info(self, mock):
+        kw = RobotKwStub()
+        step1 = Step(RobotKwStub.STEPTEXT, parent=None)
+        step1.add_robot_dependent_data(kw)
+        step2 = Step(RobotKwStub.STEPTEXT, parent=None)
+        step2.add_robot_dependent_data(kw)
+        self.assertEqual(step1.model_info, step2.model_info)
+        step1.model_info['error'] = 'only in step 1'
+        self.assertNotIn('error', step2.model_info)
+
+    def test_steps_sharing_a_keyword_have_independent_expression_lists(self, mock):
+        kw = RobotKwStub()
+        kw._doc = """*model info*
+                     :IN:  expr1
+                     :OUT: expr2
+                  """
+        step1 = Step(RobotKwStub.STEPTEXT, parent=None)
+        step1.add_robot_dependent_data(kw)
+        step2 = Step(RobotKwStub.STEPTEXT, parent=None)
+        step2.add_robot_dependent_data(kw)
+        step3 = Step(RobotKwStub.STEPTEXT, parent=None)
+        step3.copy_robot_dependent_data(step1)
+        step1.model_info['IN'].append('only in step 1')
+        step1.model_info['OUT'].clear()
+        for step in [step2, step3]:
+            self.assertEqual(step.model_info, dict(IN=['expr1'], OUT=['expr2']))
+
+    def test_analysed_data_can_be_copied_from_an_identical_step(self, mock):
+        analysed = Step(RobotKwStub.STEPTEXT, parent=None)
+        analysed.add_robot_dependent_data(RobotKwStub())
+        step = Step(RobotKwStub.STEPTEXT, parent=None)
+        step.copy_robot_dependent_data(analysed)
+        self.assertEqual(step.signature, analysed.signature)
+        self.assertEqual(step.model_info, analysed.model_info)
+        self.assertEqual(str(step), RobotKwStub.STEPTEXT)
+        step.args['${bar}'].value = 'new bar'
+        self.assertEqual(analysed.args['${bar}'].value, 'bar_value')
+
 
 class RobotKwStub:
     STEPTEXT = "Given step with foo_value and bar_value as arguments"
@@ -30,11 +30,16 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import random
 import unittest
 from unittest.mock import patch, call
+from collections import deque
+from types import SimpleNamespace
 
-from robotmbt.suiteprocessors import ModelBased
+from robotmbt.suiteprocessors import ModelBased, Flatten
 from robotmbt.suitedata import Suite, Scenario, Step
+from robotmbt.modelspace import ModelSpace
+from robotmbt.tracestate import TraceState
 
 
 @patch('robotmbt.suiteprocessors.random.seed')
@@ -217,6 +222,310 @@ class TestBatchSize(unittest.TestCase):
                                  ['init scenario'] + ['body scenario']*(out_suite.scenario_count()-1))
 
 
+class TestDiscoveryBookkeeping(unittest.TestCase):
+    def setUp(self):
+        self.processor = ModelBased()
+        self.processor._reset_discovery_bookkeeping()
+
+    def test_prio_orders_are_new_only_once(self):
+        self.assertTrue(self.processor._is_new_prio_order([1, 2, 3]))
+        self.assertTrue(self.processor._is_new_prio_order([2, 1, 3]))
+        self.assertFalse(self.processor._is_new_prio_order([1, 2, 3]))
+
+    def test_last_new_coverage_is_tracked_while_traces_are_added(self):
+        traces = [SimpleNamespace(id_trace=['1', '2'])]
+        self.assertEqual(self.processor._last_new_coverage(traces), 0)
+        traces.append(SimpleNamespace(id_trace=['2.1', '3', '2.0']))
+        self.assertEqual(self.processor._last_new_coverage(traces), 1)
+        traces.append(SimpleNamespace(id_trace=['3', '1']))
+        self.assertEqual(self.processor._last_new_coverage(traces), 1)
+        traces.append(SimpleNamespace(id_trace=['4']))
+        self.assertEqual(self.processor._last_new_coverage(traces), 3)
+
+
+class TestParallelDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.suite = Suite('testsuite')
+        init_scenario = Scenario('init scenario', self.suite, RobotTestCaseStub())
+        init_step = Step('init keyword', parent=init_scenario)
+        init_step.model_info = dict(IN=["new prop"], OUT=["prop.count = 0"])
+        init_scenario.steps = [init_step]
+        self.suite.scenarios = [init_scenario]
+        for n in range(1, 6):
+            scenario = Scenario(f'scenario {n}', self.suite, RobotTestCaseStub())
+            step = Step(f'step {n}', parent=scenario)
+            step.model_info = dict(IN=[f"prop.count == {n-1}"], OUT=["prop.count += 1"])
+            scenario.steps = [step]
+            self.suite.scenarios.append(scenario)
+
+    def test_parallel_discovery_finds_direct_trace(self):
+        processor = ModelBased()
+        processor.process_test_suite(self.suite, seed='parallel', workers=2)
+        self.assertEqual(processor.tracestate.id_trace, ['1', '2', '3', '4', '5', '6'])
+
+    def test_outcome_depends_on_seed_only(self):
+        for scenario in self.suite.scenarios[1:]:
+            scenario.steps[0].model_info = dict(IN=[],
+                                                OUT=[f"prop.count = (prop.count * 7 + {scenario.name[-1]}) % 11"])
+        traces = []
+        for workers in [2, 3, 2]:
+            processor = ModelBased()
+            processor.process_test_suite(self.suite, seed='parallel', coverage_target=0,
+                                         scenario_target=12, workers=workers)
+            traces.append(processor.tracestate.id_trace)
+        self.assertEqual(traces[0], traces[1])
+        self.assertEqual(traces[0], traces[2])
+
+    def test_traces_from_workers_refer_to_the_suites_own_objects(self):
+        for scenario in self.suite.scenarios:
+            scenario.og_tc = RobotTestCaseStub()
+        processor = ModelBased()
+        processor.process_test_suite(self.suite, seed='parallel', workers=2)
+        for scenario in processor.tracestate.get_trace():
+            own_scenario = processor._scenarios_by_id[scenario.src_id]
+            self.assertIs(scenario.og_tc, own_scenario.og_tc)
+            self.assertIs(scenario.parent, own_scenario.parent)
+            self.assertIs(scenario.steps[0], own_scenario.steps[0])
+
+    @patch('robotmbt.suiteprocessors.logger')
+    def test_invalid_number_of_workers_falls_back_to_one(self, mock):
+        processor = ModelBased()
+        processor.process_test_suite(self.suite, seed='parallel', workers=0)
+        mock.warn.assert_called_once()
+        self.assertEqual(processor.workers, 1)
+        self.assertEqual(processor.tracestate.id_trace, ['1', '2', '3', '4', '5', '6'])
+
+
+class TestPregeneration(unittest.TestCase):
+    def setUp(self):
+        self.suite = Suite('testsuite')
+        init_scenario = Scenario('init scenario', self.suite, RobotTestCaseStub())
+        init_step = Step('init keyword', parent=init_scenario)
+        init_step.model_info = dict(IN=["new prop"], OUT=["prop.count = 0"])
+        init_scenario.steps = [init_step]
+        self.suite.scenarios = [init_scenario]
+        for n in range(1, 4):
+            scenario = Scenario(f'scenario {n}', self.suite, RobotTestCaseStub())
+            step = Step(f'step {n}', parent=scenario)
+            step.model_info = dict(IN=["prop.count < 20"], OUT=[f"prop.count += {n}"])
+            scenario.steps = [step]
+            self.suite.scenarios.append(scenario)
+
+    def run_suite(self, draws_per_scenario=0, **options):
+        processor = ModelBased()
+        out_suite = processor.process_test_suite(self.suite, seed='pregenerate', coverage_target=0,
+                                                 scenario_target=9, batch_size=2, **options)
+        pending = []
+        while not processor.are_all_targets_reached():
+            processor.next_scenario_request()
+            pending.append(processor.scenarios_pending)
+            for _ in range(draws_per_scenario):  # like a keyword using the random module
+                random.random()
+        return [s.name for s in out_suite.scenarios], pending
+
+    def test_pregenerated_traces_are_reproducible(self):
+        self.assertEqual(self.run_suite(pregenerate=True), self.run_suite(pregenerate=True))
+
+    def test_pregeneration_gives_the_same_trace(self):
+        generated, _ = self.run_suite(pregenerate=False)
+        pregenerated, _ = self.run_suite(pregenerate=True)
+        self.assertEqual(generated, pregenerated)
+
+    def test_random_draws_during_execution_do_not_affect_pregenerated_trace(self):
+        self.assertEqual(self.run_suite(pregenerate=True), self.run_suite(draws_per_scenario=3, pregenerate=True))
+
+    def test_random_draws_during_execution_do_not_affect_later_batches(self):
+        self.assertEqual(self.run_suite(), self.run_suite(draws_per_scenario=3))
+
+    def test_background_generation_uses_its_own_caches_and_scorer(self):
+        processor = ModelBased()
+        processor.process_test_suite(self.suite, seed='pregenerate', coverage_target=0,
+                                     scenario_target=9, batch_size=2, pregenerate=True, scoring='history')
+        processor.next_scenario_request()
+        background = processor._pregeneration
+        for cache in ['_transpositions', '_collected_constraints', '_recent_attempts', '_scorer']:
+            self.assertIsNot(getattr(background, cache), getattr(processor, cache))
+        self.assertIsNone(background._visualiser)
+        processor.next_scenario_request()
+        processor.next_scenario_request()
+        for cache in ['_transpositions', '_collected_constraints', '_recent_attempts', '_scorer']:
+            self.assertIs(getattr(processor, cache), getattr(background, cache))
+
+    def test_pregeneration_errors_are_raised_on_handover(self):
+        processor = ModelBased()
+        processor.process_test_suite(self.suite, seed='pregenerate', coverage_target=0,
+                                     scenario_target=9, batch_size=2, pregenerate='True')
+        with patch.object(processor, '_generate_next_batch', side_effect=ValueError("generation failed")):
+            processor.next_scenario_request()
+            self.assertEqual(processor.scenarios_pending, 1)
+            processor.next_scenario_request()
+            self.assertEqual(processor.scenarios_pending, 0)
+            with self.assertRaisesRegex(ValueError, "generation failed"):
+                processor.next_scenario_request()
+
+
+class TestFlatten(unittest.TestCase):
+    def setUp(self):
+        self.topsuite = Suite('topsuite')
+        self.topsuite.setup = Step('top setup', parent=self.topsuite)
+        self.topsuite.scenarios = [self.create_scenario('top scenario', self.topsuite)]
+        self.subsuite = Suite('subsuite', parent=self.topsuite)
+        self.subsuite.setup = Step('sub setup', parent=self.subsuite)
+        self.subsuite.teardown = Step('sub teardown', parent=self.subsuite)
+        self.subsuite.scenarios = [self.create_scenario('sub scenario', self.subsuite)]
+        self.subsuite.scenarios[0].setup = Step('scenario setup', parent=self.subsuite.scenarios[0])
+        subsubsuite = Suite('subsubsuite', parent=self.subsuite)
+        subsubsuite.teardown = Step('subsub teardown', parent=subsubsuite)
+        subsubsuite.scenarios = [self.create_scenario('subsub scenario', subsubsuite)]
+        self.subsuite.suites = [subsubsuite]
+        self.topsuite.suites = [self.subsuite]
+
+    @staticmethod
+    def create_scenario(name, parent):
+        scenario = Scenario(name, parent, RobotTestCaseStub())
+        scenario.steps = [Step(f'{name} step', parent=scenario)]
+        return scenario
+
+    def test_subsuite_scenarios_come_first(self):
+        flat = Flatten.flatten(self.topsuite)
+        self.assertEqual([s.name for s in flat.scenarios], ['subsub scenario', 'sub scenario', 'top scenario'])
+        self.assertEqual(flat.suites, [])
+
+    def test_setups_and_teardowns_become_steps(self):
+        flat = Flatten.flatten(self.topsuite)
+        self.assertEqual([s.keyword for s in flat.scenarios[0].steps],
+                         ['sub setup', 'subsub scenario step', 'subsub teardown', 'sub teardown'])
+        self.assertEqual([s.keyword for s in flat.scenarios[1].steps],
+                         ['sub setup', 'scenario setup', 'sub scenario step', 'sub teardown'])
+        self.assertEqual([s.keyword for s in flat.scenarios[2].steps], ['top scenario step'])
+        self.assertIsNone(flat.scenarios[1].setup)
+        self.assertIs(flat.setup, self.topsuite.setup)
+
+    def test_input_suite_is_unchanged(self):
+        Flatten.flatten(self.topsuite)
+        self.assertEqual(len(self.topsuite.suites), 1)
+        self.assertEqual(len(self.subsuite.scenarios[0].steps), 1)
+        self.assertIsNotNone(self.subsuite.scenarios[0].setup)
+
+    def test_steps_are_shared_with_the_input_suite(self):
+        flat = Flatten.flatten(self.topsuite)
+        self.assertIsNot(flat.scenarios[2], self.topsuite.scenarios[0])
+        self.assertIs(flat.scenarios[2].steps[0], self.topsuite.scenarios[0].steps[0])
+
+
+class TestBeamSearch(unittest.TestCase):
+    def setUp(self):
+        self.suite = self.create_counter_suite()
+
+    @staticmethod
+    def create_counter_suite():
+        suite = Suite('testsuite')
+        scenarios = [('init scenario', ["new prop"], ["prop.count = 0"]),
+                     ('step up', ["prop.count < 4"], ["prop.count += 1"]),
+                     ('reach the top', ["prop.count == 4"], ["prop.top = True"]),
+                     ('step down', ["prop.count > 0"], ["prop.count -= 1"])]
+        for name, pre, post in scenarios:
+            scenario = Scenario(name, suite, RobotTestCaseStub())
+            step = Step(f'{name} step', parent=scenario)
+            step.model_info = dict(IN=pre, OUT=post)
+            scenario.steps = [step]
+            suite.scenarios.append(scenario)
+        return suite
+
+    def test_beam_search_reaches_coverage_through_repetition(self):
+        processor = ModelBased()
+        processor.process_test_suite(self.suite, seed='beam', strategy='beam', beam_width=2)
+        self.assertTrue(processor.tracestate.coverage_reached())
+        self.assertEqual(processor.tracestate.id_trace[-1], '3')
+
+    def test_outcome_depends_on_seed_only(self):
+        traces = []
+        for _ in range(2):
+            processor = ModelBased()
+            processor.process_test_suite(self.suite, seed='beam', strategy='beam', coverage_target=0,
+                                         scenario_target=12, batch_size=5)
+            while not processor.are_all_targets_reached():
+                processor.next_scenario_request()
+            traces.append(processor.tracestate.id_trace)
+        self.assertEqual(traces[0], traces[1])
+        self.assertEqual(len(traces[0]), 12)
+
+    @patch('robotmbt.suiteprocessors.logger')
+    def test_unsupported_strategy_falls_back_to_rewind(self, mock):
+        processor = ModelBased()
+        processor.process_test_suite(self.suite, seed='beam', strategy='sideways')
+        mock.warn.assert_called_once()
+        self.assertEqual(processor.strategy, 'rewind')
+        self.assertEqual(processor.tracestate.id_trace[-1], '3')
+
+    @patch('robotmbt.suiteprocessors.logger')
+    def test_invalid_beam_width_falls_back_to_default(self, mock):
+        processor = ModelBased()
+        processor.process_test_suite(self.suite, seed='beam', strategy='beam', beam_width=0)
+        mock.warn.assert_called_once()
+        self.assertEqual(processor.beam_width, 10)
+
+
+class TestCandidateScoring(unittest.TestCase):
+    def setUp(self):
+        self.suite = TestBeamSearch.create_counter_suite()
+
+    def run_suite(self, **options):
+        processor = ModelBased()
+        processor.process_test_suite(self.suite, seed='scoring', scenario_target=20, **options)
+        return processor
+
+    def test_history_scoring_reaches_the_targets(self):
+        processor = self.run_suite(scoring='history')
+        self.assertGreaterEqual(len(processor.tracestate), 20)
+        self.assertTrue(processor.tracestate.coverage_reached())
+
+    def test_outcome_depends_on_seed_only(self):
+        self.assertEqual(self.run_suite(scoring='history').tracestate.id_trace,
+                         self.run_suite(scoring='history').tracestate.id_trace)
+
+    def test_no_scoring_by_default(self):
+        self.assertIsNone(self.run_suite()._scorer)
+        self.assertIsNone(self.run_suite(scoring='None')._scorer)
+
+    @patch('robotmbt.suiteprocessors.logger')
+    def test_unsupported_scoring_falls_back_to_random_selection(self, mock):
+        processor = self.run_suite(scoring='clairvoyant')
+        mock.warn.assert_called_once()
+        self.assertIsNone(processor._scorer)
+
+
+class TestDroughtLimit(unittest.TestCase):
+    def setUp(self):
+        self.processor = ModelBased()
+        self.processor._recent_attempts = deque(maxlen=100)
+
+    @staticmethod
+    def trace_with_coverage(covered, total):
+        tracestate = TraceState(list(range(1, total+1)))
+        for id in range(1, covered+1):
+            tracestate.confirm_full_scenario(id, Scenario(str(id), None, RobotTestCaseStub()), ModelSpace())
+        return tracestate
+
+    def test_limit_grows_when_few_scenarios_are_left_uncovered(self):
+        self.assertLess(self.processor._drought_limit(self.trace_with_coverage(10, 20)),
+                        self.processor._drought_limit(self.trace_with_coverage(19, 20)))
+
+    def test_limit_shrinks_when_most_attempts_are_rejected(self):
+        tracestate = self.trace_with_coverage(10, 20)
+        self.processor._recent_attempts.extend([True] * 100)
+        succeeding = self.processor._drought_limit(tracestate)
+        self.processor._recent_attempts.extend([False] * 90)
+        self.assertLess(self.processor._drought_limit(tracestate), succeeding)
+
+    def test_limit_stays_within_bounds(self):
+        self.processor._recent_attempts.extend([False] * 100)
+        self.assertEqual(self.processor._drought_limit(self.trace_with_coverage(0, 1000)), ModelBased.MIN_DROUGHT_LIMIT)
+        self.processor._recent_attempts.extend([True] * 100)
+        self.assertEqual(self.processor._drought_limit(self.trace_with_coverage(999, 1000)),
+                         ModelBased.MAX_DROUGHT_LIMIT)
+
+
 class RobotTestCaseStub:
     def copy(self, **kwargs):
         pass
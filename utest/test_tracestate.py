@@ -31,6 +31,9 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import unittest
+from unittest.mock import patch
+
+from robotmbt.modelspace import ModelSpace, ModellingError
 from robotmbt.tracestate import TraceState
 
 
@@ -154,6 +157,28 @@ class TestTraceState(unittest.TestCase):
         new = ts.next_candidate(retry=True, randomise=True)
         self.assertNotEqual(new, first)
 
+    def test_all_next_candidates_can_be_listed(self):
+        ts = TraceState([1, 2, 3])
+        ts.confirm_full_scenario(2, ScenarioStub(), ModelStub())
+        self.assertEqual(ts.next_candidates(), [1, 3])
+        self.assertEqual(ts.next_candidates(retry=True), [1, 3, 2])
+        ts.reject_scenario(1)
+        ts.reject_scenario(3)
+        self.assertEqual(ts.next_candidates(), [])
+        self.assertEqual(ts.next_candidates(retry=True), [2])
+
+    def test_randomised_candidates_can_be_weighed(self):
+        ts = TraceState([1, 2, 3])
+        picks = {ts.next_candidate(randomise=True, weigh=lambda id: 1.0 if id == 3 else 1e-9) for _ in range(20)}
+        self.assertEqual(picks, {3})
+
+    def test_weighing_does_not_override_the_preference_for_uncovered_candidates(self):
+        ts = TraceState([1, 2])
+        ts.confirm_full_scenario(1, ScenarioStub(), ModelStub())
+        picks = {ts.next_candidate(retry=True, randomise=True, weigh=lambda id: 1.0 if id == 1 else 1e-9)
+                 for _ in range(20)}
+        self.assertEqual(picks, {2})
+
     def test_count_scenario_repetitions(self):
         ts = TraceState([1, 2])
         first = ts.next_candidate()
@@ -378,6 +403,89 @@ class TestTraceState(unittest.TestCase):
         ts.rewind()
         self.assertFalse(ts.can_rewind())
 
+    def test_rewind_to_recovery_point_jumps_back_to_last_new_coverage(self):
+        ts = TraceState([1, 2, 3])
+        ts.confirm_full_scenario(1, ScenarioStub('one'), ModelStub())
+        ts.confirm_full_scenario(2, ScenarioStub('two'), ModelStub())
+        for _ in range(3):
+            ts.confirm_full_scenario(1, ScenarioStub('one'), ModelStub())
+        self.assertEqual(ts.coverage_drought, 3)
+        tail = ts.rewind_to_recovery_point()
+        self.assertEqual(tail.scenario, 'two')
+        self.assertEqual(ts.get_trace(), ['one', 'two'])
+        self.assertEqual(ts.coverage_drought, 0)
+        self.assertEqual(ts.count(1), 1)
+
+    def test_rewind_to_recovery_point_matches_repeated_rewinds(self):
+        def build():
+            ts = TraceState([1, 2, 3])
+            ts.confirm_full_scenario(1, ScenarioStub('one'), ModelStub())
+            ts.reject_scenario(3)
+            ts.confirm_full_scenario(2, ScenarioStub('two'), ModelStub())
+            ts.confirm_full_scenario(1, ScenarioStub('one'), ModelStub())
+            ts.reject_scenario(3)
+            ts.confirm_full_scenario(2, ScenarioStub('two'), ModelStub())
+            return ts
+        jumped = build()
+        jumped.rewind_to_recovery_point()
+        stepped = build()
+        stepped.rewind()
+        while stepped.coverage_drought:
+            stepped.rewind()
+        self.assertEqual(jumped.id_trace, stepped.id_trace)
+        self.assertEqual(jumped.c_pool, stepped.c_pool)
+        self.assertEqual(jumped.tried, stepped.tried)
+        self.assertEqual(jumped.next_candidate(retry=True), stepped.next_candidate(retry=True))
+
+    def test_rewind_to_recovery_point_rewinds_at_least_one_scenario(self):
+        ts = TraceState([1, 2])
+        ts.confirm_full_scenario(1, ScenarioStub('one'), ModelStub())
+        ts.confirm_full_scenario(2, ScenarioStub('two'), ModelStub())
+        ts.rewind_to_recovery_point()
+        self.assertEqual(ts.get_trace(), ['one'])
+
+    def test_rewind_to_recovery_point_respects_rewind_limit(self):
+        ts = TraceState([1, 2])
+        ts.confirm_full_scenario(1, ScenarioStub('one'), ModelStub())
+        ts.confirm_full_scenario(1, ScenarioStub('one'), ModelStub())
+        ts.confirm_full_scenario(1, ScenarioStub('one'), ModelStub())
+        ts.rewind_limit = 2
+        self.assertIsNone(ts.rewind_to_recovery_point())
+        self.assertEqual(len(ts), 3)
+
+    def test_rewind_to_recovery_point_skips_open_refinements(self):
+        ts = TraceState([1, 2, 3])
+        ts.confirm_full_scenario(3, ScenarioStub('three'), ModelStub())
+        ts.push_partial_scenario(1, ScenarioStub('part1'), ModelStub())
+        ts.confirm_full_scenario(2, ScenarioStub('two'), ModelStub())
+        ts.confirm_full_scenario(1, ScenarioStub('part2'), ModelStub())
+        ts.confirm_full_scenario(3, ScenarioStub('three'), ModelStub())
+        ts.rewind_to_recovery_point()
+        self.assertEqual(ts.get_trace(), ['three', 'part1', 'two', 'part2'])
+        ts.rewind_to_recovery_point()
+        self.assertEqual(ts.get_trace(), ['three'])
+        self.assertEqual(ts.active_refinements, [])
+        self.assertEqual(ts.c_pool, {1: 0, 2: 0, 3: 1})
+        self.assertEqual(ts.next_candidate(), 2)
+
+    def test_rewind_to_recovery_point_rewinds_further_than_repeated_rewinds_in_open_refinement(self):
+        def build():
+            ts = TraceState([1, 2, 3])
+            ts.confirm_full_scenario(3, ScenarioStub('three'), ModelStub())
+            ts.push_partial_scenario(1, ScenarioStub('part1'), ModelStub())
+            ts.confirm_full_scenario(2, ScenarioStub('two'), ModelStub())
+            ts.confirm_full_scenario(3, ScenarioStub('three'), ModelStub())
+            return ts
+        stepped = build()
+        stepped.rewind()
+        while stepped.coverage_drought:
+            stepped.rewind()
+        self.assertEqual(stepped.get_trace(), ['three', 'part1', 'two'])
+        jumped = build()
+        jumped.rewind_to_recovery_point()
+        self.assertEqual(jumped.get_trace(), ['three'])
+        self.assertEqual(jumped.active_refinements, [])
+
     def test_trace_id_properties(self):
         ts = TraceState([4, 1, 2, 3])
         ts.confirm_full_scenario(3, ScenarioStub(), ModelStub())
@@ -671,6 +779,81 @@ class TestPartialScenarios(unittest.TestCase):
         ts.rewind_limit = 2
         self.assertFalse(ts.can_rewind())
 
+    def test_covered_ids_follow_rewinds(self):
+        ts = TraceState([1, 2, 3])
+        for i in [2, 1, 2, 3]:
+            ts.confirm_full_scenario(i, ScenarioStub(), ModelStub())
+        self.assertEqual(ts.covered_ids, [2, 1, 3])
+        ts.rewind()
+        ts.rewind()
+        self.assertEqual(ts.covered_ids, [2, 1])
+        ts.rewind()
+        ts.rewind()
+        self.assertEqual(ts.covered_ids, [])
+        ts.confirm_full_scenario(3, ScenarioStub(), ModelStub())
+        ts.confirm_full_scenario(1, ScenarioStub(), ModelStub())
+        self.assertEqual(ts.covered_ids, [3, 1])
+
+    def test_copy_keeps_its_own_bookkeeping(self):
+        ts = TraceState([1, 2, 3])
+        ts.confirm_full_scenario(1, ScenarioStub(), ModelStub())
+        ts.reject_scenario(3)
+        cp = ts.copy()
+        cp.confirm_full_scenario(2, ScenarioStub(), ModelStub())
+        cp.rewind()
+        cp.rewind()
+        self.assertEqual(cp.covered_ids, [])
+        self.assertEqual(ts.covered_ids, [1])
+        self.assertEqual(ts.tried, [3])
+        self.assertEqual(ts.next_candidate(), 2)
+        self.assertEqual(cp.tried, [1])
+        self.assertEqual(cp.next_candidate(), 2)
+
+    def test_copies_keep_their_own_bookkeeping_after_rewinding_to_a_shared_level(self):
+        ts = TraceState([1, 2, 3])
+        ts.confirm_full_scenario(1, ScenarioStub(), ModelStub())
+        ts.confirm_full_scenario(2, ScenarioStub(), ModelStub())
+        cp = ts.copy()
+        ts.rewind()
+        ts.reject_scenario(3)
+        cp.confirm_full_scenario(1, ScenarioStub(), ModelStub())
+        cp.rewind()
+        self.assertEqual(ts.tried, [2, 3])
+        self.assertEqual(cp.tried, [1])
+        cp.rewind()
+        self.assertEqual(cp.tried, [2])
+        self.assertEqual(cp.next_candidate(), 3)
+        self.assertEqual(ts.count(1), 1)
+        self.assertEqual(cp.count(1), 1)
+
+    def test_snapshots_share_the_terms_a_scenario_left_unchanged(self):
+        ts = TraceState([1, 2])
+        model = ModelSpace()
+        model.process_expression('new foo1')
+        model.process_expression('foo1.bar = 1')
+        model.process_expression('new foo2')
+        ts.confirm_full_scenario(1, ScenarioStub(), model)
+        model.process_expression('foo2.bar = 2')
+        ts.confirm_full_scenario(2, ScenarioStub(), model)
+        self.assertIs(ts[-1].model.props['foo1'], ts[-2].model.props['foo1'])
+        self.assertIsNot(ts[-1].model.props['foo2'], ts[-2].model.props['foo2'])
+        self.assertIs(ts[-1].model.process_expression('foo2.bar == 2'), True)
+        self.assertRaises(ModellingError, ts[-2].model.process_expression, 'foo2.bar')
+
+    def test_snapshot_models_inherit_the_fingerprint(self):
+        ts = TraceState([1])
+        model = ModelSpace()
+        model.process_expression('new foo')
+        ts.confirm_full_scenario(1, ScenarioStub(), model)
+        with patch.object(ModelSpace, 'get_status_text') as status_text, \
+                patch.object(ModelSpace, '_state_text') as state_text:
+            fingerprints = {ts.model.fingerprint, ts.model.fingerprint, ts[-1].fingerprint}
+            state_keys = {ts.model.state_key, ts[-1].state_key}
+        status_text.assert_not_called()
+        state_text.assert_not_called()
+        self.assertEqual(fingerprints, {model.fingerprint})
+        self.assertEqual(state_keys, {model.state_key})
+
 
 class ScenarioStub(str):
     """Stub for suitedata.Scenario"""